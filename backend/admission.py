@@ -0,0 +1,157 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# Lanes in priority order: a free slot always goes to the oldest interactive waiter first
+LANES = ("interactive", "batch")
+
+
+class Overloaded(Exception):
+    """Request refused by admission control; map to an HTTP status with Retry-After"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("future", "deadline", "enqueued")
+
+    def __init__(self, future: asyncio.Future, deadline: float):
+        self.future = future
+        self.deadline = deadline
+        self.enqueued = time.monotonic()
+
+
+class Ticket:
+    def __init__(self, lane: str, queue_time: float):
+        self.lane = lane
+        self.queue_time = queue_time
+        self.started = time.monotonic()
+
+    @property
+    def service_time(self) -> float:
+        return time.monotonic() - self.started
+
+
+class AdmissionController:
+    """Bounded concurrency with per-lane queues, priority dispatch and deadline-aware shedding.
+
+    - At most `max_concurrent` requests hold a slot at once.
+    - A full lane queue rejects immediately (429), so bursts fail fast instead of piling up.
+    - A request whose deadline passes while queued is dropped (503) before any work starts,
+      and expired waiters are skipped when a slot frees up.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: Optional[Dict[str, int]] = None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = {lane: 32 for lane in LANES}
+        self.max_queue.update(max_queue or {})
+        self._active = 0
+        self._queues = {lane: deque() for lane in LANES}
+        # Exponentially weighted mean service time, used to size Retry-After
+        self._service_ewma = 1.0
+        self.stats = {"admitted": 0, "rejected_queue_full": 0, "expired": 0}
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "active": self._active,
+            "queued": {lane: len(q) for lane, q in self._queues.items()},
+            "mean_service_time": round(self._service_ewma, 3)
+        }
+
+    def retry_after(self) -> int:
+        backlog = self._active + sum(len(q) for q in self._queues.values())
+        return max(1, math.ceil(self._service_ewma * backlog / self.max_concurrent))
+
+    def _has_waiters_at_or_above(self, lane: str) -> bool:
+        for other in LANES:
+            if self._queues[other]:
+                return True
+            if other == lane:
+                return False
+        return False
+
+    def _dispatch(self):
+        now = time.monotonic()
+        for lane in LANES:
+            queue = self._queues[lane]
+            while queue and self._active < self.max_concurrent:
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    continue
+                if waiter.deadline <= now:
+                    self.stats["expired"] += 1
+                    waiter.future.set_exception(
+                        Overloaded(503, "Request deadline passed while queued", self.retry_after())
+                    )
+                    continue
+                self._active += 1
+                waiter.future.set_result(None)
+
+    def _release(self, service_time: Optional[float] = None):
+        self._active -= 1
+        if service_time is not None:
+            self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_time
+        self._dispatch()
+
+    @staticmethod
+    def _discard(queue: deque, waiter: _Waiter):
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+
+    async def _acquire(self, lane: str, deadline: float) -> float:
+        if lane not in self._queues:
+            raise ValueError(f"Unknown admission lane {lane!r}")
+        start = time.monotonic()
+        if deadline <= start:
+            self.stats["expired"] += 1
+            raise Overloaded(503, "Request deadline already passed", self.retry_after())
+
+        if self._active < self.max_concurrent and not self._has_waiters_at_or_above(lane):
+            self._active += 1
+            return 0.0
+
+        queue = self._queues[lane]
+        if len(queue) >= self.max_queue[lane]:
+            self.stats["rejected_queue_full"] += 1
+            raise Overloaded(429, f"Too many queued {lane} requests", self.retry_after())
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), deadline)
+        queue.append(waiter)
+        try:
+            await asyncio.wait({waiter.future}, timeout=deadline - start)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                self._release()
+            else:
+                waiter.future.cancel()
+                self._discard(queue, waiter)
+            raise
+
+        if not waiter.future.done():
+            waiter.future.cancel()
+            self._discard(queue, waiter)
+            self.stats["expired"] += 1
+            raise Overloaded(503, "Request deadline passed while queued", self.retry_after())
+        waiter.future.result()  # raises Overloaded if dropped at dispatch
+        return time.monotonic() - start
+
+    @asynccontextmanager
+    async def slot(self, lane: str, deadline: float):
+        """Hold one concurrency slot; `deadline` is a time.monotonic() timestamp"""
+        queue_time = await self._acquire(lane, deadline)
+        self.stats["admitted"] += 1
+        ticket = Ticket(lane, queue_time)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket.service_time)
@@ -1,6 +1,5 @@
-import json
-import google.generativeai as genai
 from typing import List, Dict
+from response_parser import generate_json, ResponseParseError, DECISION_SCHEMA
 
 def build_claim_prompt(query: str, context_docs: List[Dict]) -> str:
     context_text = "\n---\n".join([doc["content"] for doc in context_docs])
@@ -23,12 +22,8 @@ Reply only in valid JSON format.
     return prompt
 
 async def call_gemini_api(prompt: str) -> Dict:
-    model = genai.GenerativeModel('gemini-2.5-pro')
-    response = model.generate_content(prompt)
-    text = response.text.strip()
     try:
-        if text.startswith('{'):
-            return json.loads(text)
-    except Exception:
-        pass
-    return {"decision": "REVIEW", "justification": text, "confidence_score": 0.7}
+        # No output cap: 2.5-pro's thinking tokens count against it and would truncate the answer
+        return await generate_json('gemini-2.5-pro', prompt, DECISION_SCHEMA, max_output_tokens=None)
+    except ResponseParseError as e:
+        return {"decision": "REVIEW", "justification": e.text.strip(), "confidence_score": 0.0}
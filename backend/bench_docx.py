@@ -0,0 +1,78 @@
+"""DOCX extraction time and peak memory: python-docx vs. the streaming extractor.
+
+    python bench_docx.py --paragraphs 20000 --tables 200 --rows 20
+
+Generates a synthetic document with headings, paragraphs and tables (needs python-docx),
+then extracts it three ways. Only the last two see table text. tracemalloc does not see
+lxml's C allocations, so python-docx's real peak is higher than reported.
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import docx
+from docx_stream import extract_text_docx_stream
+
+
+def build_document(path: str, paragraphs: int, tables: int, rows: int):
+    document = docx.Document()
+    per_table = max(1, paragraphs // max(1, tables))
+    for i in range(paragraphs):
+        if i % per_table == 0:
+            document.add_heading(f"Clause {i // per_table + 1}", level=1)
+        document.add_paragraph(f"Paragraph {i}: the insured shall notify the insurer within thirty days "
+                               f"of any event that may give rise to a claim under section {i % 97}.")
+        if i % per_table == per_table - 1 and i // per_table < tables:
+            table = document.add_table(rows=rows, cols=4)
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    cell.text = f"r{r}c{c} limit {r * c * 1000}"
+    document.save(path)
+
+
+def python_docx_paragraphs(path: str) -> str:
+    document = docx.Document(path)
+    return "\n".join(p.text for p in document.paragraphs)
+
+
+def python_docx_with_tables(path: str) -> str:
+    document = docx.Document(path)
+    parts = [p.text for p in document.paragraphs]
+    for table in document.tables:
+        for row in table.rows:
+            parts.append(" | ".join(cell.text for cell in row.cells))
+    return "\n".join(parts)
+
+
+def measure(fn, path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    text = fn(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=20000)
+    parser.add_argument("--tables", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.docx")
+        build_document(path, args.paragraphs, args.tables, args.rows)
+        print(f"{args.paragraphs} paragraphs, {args.tables} tables x {args.rows} rows, "
+              f"{os.path.getsize(path) / 1e6:.1f} MB on disk")
+        for name, fn in (("python-docx paragraphs", python_docx_paragraphs),
+                         ("python-docx + tables", python_docx_with_tables),
+                         ("streaming", extract_text_docx_stream)):
+            elapsed, peak, chars = measure(fn, path)
+            print(f"{name:24s}: {elapsed:6.2f}s  peak {peak / 1e6:7.1f} MB  {chars} chars")
+
+
+if __name__ == "__main__":
+    main()
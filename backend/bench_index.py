@@ -0,0 +1,72 @@
+"""Compare memory, search latency and recall of float32 / float16 / int8 indexes.
+
+    python bench_index.py --chunks 100000 --queries 200 --top-k 5
+
+Uses clustered random 384-dim vectors so it runs without the embedding model.
+"""
+import argparse
+import sys
+import time
+import numpy as np
+from vector_index import VectorIndex, INDEX_DTYPES
+
+
+def synthetic_vectors(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    # Clustered data gives realistic near-ties, unlike isotropic noise
+    centers = rng.standard_normal((max(1, n // 50), dim)).astype(np.float32)
+    assignments = rng.integers(0, len(centers), n)
+    return centers[assignments] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def list_of_arrays_bytes(vectors: np.ndarray) -> int:
+    """Footprint of the previous representation: row views into each encode() matrix,
+    i.e. the float32 data once plus one ndarray header per chunk"""
+    return vectors.nbytes + sum(sys.getsizeof(v) for v in vectors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = synthetic_vectors(args.chunks, args.dim, rng)
+    queries = data[rng.integers(0, args.chunks, args.queries)] + 0.3 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+
+    print(f"{args.chunks} chunks, {args.queries} queries, top-{args.top_k}")
+    print(f"list of float32 arrays (previous layout): {list_of_arrays_bytes(data) / 1e6:.1f} MB")
+
+    reference = None
+    for dtype in INDEX_DTYPES:
+        index = VectorIndex(dim=args.dim, dtype=dtype, rescore_factor=args.rescore_factor)
+        index.add(data)
+
+        index.search(queries[:1], top_k=args.top_k)  # warm-up
+        start = time.perf_counter()
+        per_query = []
+        for q in queries:
+            _, ids = index.search(q, top_k=args.top_k)
+            per_query.append(ids[0])
+        elapsed = time.perf_counter() - start
+        batch_start = time.perf_counter()
+        index.search(queries, top_k=args.top_k)
+        batch_elapsed = time.perf_counter() - batch_start
+
+        if reference is None:
+            reference = per_query
+        recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(per_query, reference)])
+        print(
+            f"{dtype:>8}: {index.nbytes / 1e6:7.1f} MB  "
+            f"{1000 * elapsed / len(queries):6.2f} ms/query  "
+            f"{1000 * batch_elapsed / len(queries):6.2f} ms/query batched  "
+            f"recall@{args.top_k} vs float32 {recall:.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
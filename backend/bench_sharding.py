@@ -0,0 +1,85 @@
+"""Search throughput of the in-process index vs. a ShardedIndex with 1..N worker processes.
+
+    python bench_sharding.py --chunks 400000 --documents 2000 --shards 1 2 4 --clients 4
+
+Vectors are random, so only throughput is meaningful here (see bench_index.py for recall).
+Each client thread issues single-query searches back to back, like concurrent /process-claim calls.
+"""
+import argparse
+import os
+import threading
+import time
+import numpy as np
+from vector_index import VectorIndex
+from sharded_index import ShardedIndex
+
+
+def run_clients(search, queries: np.ndarray, clients: int, seconds: float) -> float:
+    stop = time.perf_counter() + seconds
+    counts = [0] * clients
+
+    def worker(i):
+        n = 0
+        while time.perf_counter() < stop:
+            search(queries[(i + n * clients) % len(queries)])
+            n += 1
+        counts[i] = n
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dtype", default="float32")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.chunks, 384)).astype(np.float32)
+    queries = rng.standard_normal((256, 384)).astype(np.float32)
+    boundaries = np.linspace(0, args.chunks, args.documents + 1).astype(int)
+    print(f"{args.chunks} chunks in {args.documents} documents, {args.clients} client threads, "
+          f"{os.cpu_count()} CPUs")
+
+    index = VectorIndex(dtype=args.dtype)
+    index.add(vectors)
+    qps = run_clients(lambda q: index.search(q, top_k=args.top_k), queries, args.clients, args.seconds)
+    print(f"in-process : {qps:8.1f} queries/s")
+
+    for n in args.shards:
+        sharded = ShardedIndex(n, dtype=args.dtype)
+        try:
+            for d in range(args.documents):
+                lo, hi = boundaries[d], boundaries[d + 1]
+                sharded.add_document(f"doc{d}", [f"doc{d}_{i}" for i in range(lo, hi)], vectors[lo:hi])
+            sharded.search(queries[0], top_k=args.top_k)  # warm-up
+            qps = run_clients(lambda q: sharded.search(q, top_k=args.top_k), queries, args.clients, args.seconds)
+
+            # Delete a quarter of the documents from shard 0 and let rebalancing even things out
+            start = time.perf_counter()
+            victims = [doc for doc, shard in list(sharded.assignments.items()) if shard == 0][: args.documents // 4]
+            for doc in victims:
+                sharded.remove_document(doc, rebalance=False)
+            before = sharded.shard_sizes()
+            moves = sharded.rebalance()
+            elapsed = time.perf_counter() - start
+            print(f"{n} shard(s) : {qps:8.1f} queries/s  "
+                  f"rebalance after deleting {len(victims)} docs: {before} -> {sharded.shard_sizes()} "
+                  f"({moves} moves, {elapsed:.2f}s)")
+        finally:
+            sharded.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Iterator
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+_P, _T, _TAB, _BR, _CR = W + "p", W + "t", W + "tab", W + "br", W + "cr"
+_TBL, _TR, _TC = W + "tbl", W + "tr", W + "tc"
+_PSTYLE, _SECTPR, _RENDERED_BREAK = W + "pStyle", W + "sectPr", W + "lastRenderedPageBreak"
+_BODY = W + "body"
+
+
+def _is_heading(style: str) -> bool:
+    style = style.lower().replace(" ", "")
+    return style.startswith("heading") or style == "title"
+
+
+def iter_docx_segments(path: str) -> Iterator[dict]:
+    """Stream paragraphs and table rows from word/document.xml in document order.
+
+    Yields {"text", "page", "section", "kind"} where kind is "heading", "paragraph" or
+    "table_row" (cells joined with " | "; nested tables are flattened into their cell).
+    Pages come from Word's rendered page breaks when present, else explicit page breaks.
+    Section is the latest heading, or "Section N" after N-1 section breaks without one.
+    Processed elements are cleared as we go, so memory stays flat on large wordings.
+    """
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as stream:
+        body = None
+        paragraphs = []   # stack of text-part lists (text boxes nest paragraphs)
+        styles = []
+        ends_section = []
+        cells = []        # stack of paragraph-text lists, one per open table cell
+        rows = []         # stack of cell-text lists, one per open table
+        fallback_depth = 0
+        explicit_page, rendered_page, seen_rendered = 1, 1, False
+        section_number, heading = 1, None
+        page_at_start = []
+
+        def page():
+            return rendered_page if seen_rendered else explicit_page
+
+        def section():
+            return heading or f"Section {section_number}"
+
+        for event, elem in ET.iterparse(stream, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                # Nothing inside a Fallback is pushed, so its ends have nothing to pop
+                if tag == MC_FALLBACK:
+                    fallback_depth += 1
+                elif fallback_depth:
+                    pass
+                elif tag == _P:
+                    paragraphs.append([])
+                    styles.append("")
+                    ends_section.append(False)
+                    page_at_start.append(page())
+                elif tag == _TBL:
+                    rows.append(None)
+                elif tag == _TR:
+                    rows[-1] = []
+                elif tag == _TC:
+                    cells.append([])
+                elif tag == _BODY:
+                    body = elem
+                continue
+
+            if tag == MC_FALLBACK:
+                fallback_depth -= 1
+            elif fallback_depth:
+                continue
+            elif tag == _T:
+                if paragraphs and elem.text:
+                    paragraphs[-1].append(elem.text)
+            elif tag == _TAB:
+                if paragraphs:
+                    paragraphs[-1].append("\t")
+            elif tag == _CR:
+                if paragraphs:
+                    paragraphs[-1].append("\n")
+            elif tag == _BR:
+                if elem.get(W + "type") == "page":
+                    explicit_page += 1
+                elif paragraphs:
+                    paragraphs[-1].append("\n")
+            elif tag == _RENDERED_BREAK:
+                seen_rendered = True
+                rendered_page += 1
+                if paragraphs and not "".join(paragraphs[-1]).strip():
+                    page_at_start[-1] = page()
+            elif tag == _PSTYLE:
+                if styles:
+                    styles[-1] = elem.get(W + "val", "")
+            elif tag == _SECTPR:
+                # A sectPr inside a paragraph makes it the last one of its section;
+                # the body-level sectPr just describes the final section
+                if paragraphs:
+                    ends_section[-1] = True
+            elif tag == _P:
+                text = "".join(paragraphs.pop()).strip()
+                style = styles.pop()
+                start_page = page_at_start.pop()
+                if text:
+                    if cells:
+                        cells[-1].append(text)
+                    elif _is_heading(style):
+                        heading = text
+                        yield {"text": f"## {text}", "page": start_page, "section": section(), "kind": "heading"}
+                    else:
+                        yield {"text": text, "page": start_page, "section": section(), "kind": "paragraph"}
+                if ends_section.pop():
+                    section_number += 1
+                    heading = None
+                if not cells and not paragraphs:
+                    elem.clear()
+            elif tag == _TC:
+                rows[-1].append(" ".join(cells.pop()))
+            elif tag == _TR:
+                row = [c for c in rows[-1] if c]
+                rows[-1] = None
+                if row:
+                    row_text = " | ".join(row)
+                    if cells:
+                        cells[-1].append(row_text)
+                    else:
+                        yield {"text": row_text, "page": page(), "section": section(), "kind": "table_row"}
+            elif tag == _TBL:
+                rows.pop()
+                if not cells:
+                    elem.clear()
+
+            if body is not None and not paragraphs and not rows and tag in (_P, _TBL):
+                body.clear()
+
+
+def extract_text_docx_stream(path: str) -> str:
+    return "\n".join(segment["text"] for segment in iter_docx_segments(path))
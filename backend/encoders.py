@@ -0,0 +1,211 @@
+import os
+import json
+import inspect
+import logging
+import tempfile
+from typing import List, Optional, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# "torch" runs SentenceTransformer in eager PyTorch; "onnx" exports the same weights to ONNX Runtime
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_ONNX_QUANTIZE = os.getenv("EMBEDDING_ONNX_QUANTIZE", "0") == "1"
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "model_cache")
+EMBEDDING_PARITY_CHECK = os.getenv("EMBEDDING_PARITY_CHECK", "1") == "1"
+# 0 leaves the runtime default (all cores)
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+
+PARITY_MIN_COSINE = 0.99
+PARITY_SENTENCES = [
+    "Does my policy cover emergency medical evacuation during international travel?",
+    "Pre-existing conditions are excluded for the first 48 months of continuous coverage.",
+    "Room rent is limited to 1% of the sum insured per day.",
+    "Claim for knee replacement surgery at a network hospital, patient age 46, policy 3 months old.",
+    "The insurer shall not be liable for any expenses arising from cosmetic treatment.",
+    "short",
+]
+
+
+class TorchEncoder:
+    """Reference SentenceTransformer encoder (PyTorch eager mode)"""
+
+    backend = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, threads: int = EMBEDDING_THREADS):
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        return self.model.encode(sentences, batch_size=batch_size, **kwargs)
+
+
+def export_onnx(model_name: str = EMBEDDING_MODEL_NAME, cache_dir: str = EMBEDDING_ONNX_DIR,
+                quantize: bool = EMBEDDING_ONNX_QUANTIZE) -> str:
+    """Export the transformer of a SentenceTransformer model to ONNX (once) and return the model dir.
+
+    Pooling and normalization stay in NumPy, so only the encoder graph is exported.
+    With `quantize`, a dynamically int8-quantized copy is written next to it.
+    """
+    out_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(out_dir, "model.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logger.info(f"Exporting {model_name} to ONNX in {out_dir}")
+        os.makedirs(out_dir, exist_ok=True)
+        st_model = SentenceTransformer(model_name, device="cpu")
+        transformer = st_model[0].auto_model.eval()
+        tokenizer = st_model.tokenizer
+
+        class _LastHiddenState(torch.nn.Module):
+            def __init__(self, model):
+                super().__init__()
+                self.model = model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                  token_type_ids=token_type_ids)[0]
+
+        dummy = tokenizer(["export sample text"], return_tensors="pt")
+        names = ["input_ids", "attention_mask", "token_type_ids"]
+        # Unique temp names: several workers may export at once, and the last rename wins
+        tmp_path = _temp_path(out_dir, ".onnx.tmp")
+        # Newer torch defaults to the dynamo exporter; the TorchScript one handles dynamic axes here
+        legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+        with torch.no_grad():
+            torch.onnx.export(
+                _LastHiddenState(transformer),
+                tuple(dummy[name] for name in names),
+                tmp_path,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+                opset_version=14,
+                **legacy
+            )
+        tokenizer.save_pretrained(out_dir)
+        config_tmp = _temp_path(out_dir, ".json.tmp")
+        with open(config_tmp, "w") as f:
+            json.dump({"model_name": model_name, "max_seq_length": st_model.max_seq_length}, f)
+        os.replace(config_tmp, os.path.join(out_dir, "encoder_config.json"))
+        os.replace(tmp_path, fp32_path)
+
+    if quantize and not os.path.exists(os.path.join(out_dir, "model_int8.onnx")):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        logger.info(f"Quantizing {fp32_path} to int8")
+        tmp_path = _temp_path(out_dir, ".onnx.tmp")
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, os.path.join(out_dir, "model_int8.onnx"))
+
+    return out_dir
+
+
+def _temp_path(directory: str, suffix: str) -> str:
+    fd, path = tempfile.mkstemp(dir=directory, suffix=suffix)
+    os.close(fd)
+    return path
+
+
+class OnnxEncoder:
+    """all-MiniLM-L6-v2 on ONNX Runtime: mean pooling + L2 normalization, length-sorted batches"""
+
+    backend = "onnx"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, cache_dir: str = EMBEDDING_ONNX_DIR,
+                 quantize: bool = EMBEDDING_ONNX_QUANTIZE, threads: int = EMBEDDING_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = export_onnx(model_name, cache_dir, quantize)
+        with open(os.path.join(model_dir, "encoder_config.json")) as f:
+            self.max_seq_length = json.load(f)["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.quantized = quantize
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = "model_int8.onnx" if quantize else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        # last_hidden_state is (batch, sequence, hidden); hidden is a fixed dim of the graph
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        if not sentences:
+            return np.empty((0, self.dimension), dtype=np.float32)
+
+        # Sort by length so each batch pads to a similar length, then restore input order
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        outputs = [None] * len(sentences)
+        for start in range(0, len(sentences), batch_size):
+            batch_idx = order[start:start + batch_size]
+            encoded = self.tokenizer(
+                [sentences[i] for i in batch_idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+            if "token_type_ids" in self._input_names and "token_type_ids" not in feeds:
+                feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+            hidden = self.session.run(None, feeds)[0]
+
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, vec in zip(batch_idx, pooled):
+                outputs[i] = vec
+
+        embeddings = np.vstack(outputs).astype(np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def check_parity(candidate, reference, sentences: Optional[List[str]] = None) -> float:
+    """Minimum cosine similarity between two encoders' embeddings of the same sentences"""
+    sentences = sentences or PARITY_SENTENCES
+    a = np.asarray(candidate.encode(sentences), dtype=np.float32)
+    b = np.asarray(reference.encode(sentences), dtype=np.float32)
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    return float((a * b).sum(axis=1).min())
+
+
+def load_encoder(backend: Optional[str] = None):
+    """Build the configured encoder, falling back to PyTorch if ONNX is unavailable or fails parity"""
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "torch":
+        return TorchEncoder()
+    if backend != "onnx":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}, expected 'torch' or 'onnx'")
+
+    try:
+        encoder = OnnxEncoder()
+    except Exception as e:
+        logger.error(f"ONNX encoder unavailable, falling back to PyTorch: {e}")
+        return TorchEncoder()
+
+    if EMBEDDING_PARITY_CHECK:
+        reference = TorchEncoder()
+        min_cosine = check_parity(encoder, reference)
+        logger.info(f"ONNX encoder parity vs PyTorch: min cosine {min_cosine:.5f}")
+        if min_cosine < PARITY_MIN_COSINE:
+            logger.error(f"ONNX encoder failed parity check ({min_cosine:.5f} < {PARITY_MIN_COSINE}), using PyTorch")
+            return reference
+    return encoder
@@ -1,7 +1,7 @@
 import PyPDF2
-import docx
+from docx_stream import extract_text_docx_stream
 from typing import List
-from sentence_transformers import SentenceTransformer
+from encoders import load_encoder
 import numpy as np
 
 embedding_model = None
@@ -9,7 +9,7 @@ embedding_model = None
 def init_model():
     global embedding_model
     if embedding_model is None:
-        embedding_model = SentenceTransformer('all-MiniLM-v2')
+        embedding_model = load_encoder()
 
 def extract_text_pdf(file_path: str) -> str:
     text = ""
@@ -24,8 +24,7 @@ def extract_text_pdf(file_path: str) -> str:
 
 def extract_text_docx(file_path: str) -> str:
     try:
-        doc = docx.Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs])
+        return extract_text_docx_stream(file_path)
     except Exception:
         return ""
 
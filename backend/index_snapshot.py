@@ -0,0 +1,147 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from typing import List, Optional
+import numpy as np
+
+SNAPSHOT_FORMAT_VERSION = 2
+# Version 1 snapshots (no checksums) still load
+READABLE_FORMAT_VERSIONS = (1, 2)
+
+# A snapshot root holds immutable version directories plus a CURRENT pointer file:
+#   <root>/CURRENT                -> "snap-20240101T120000123456-1a2b3c4d"
+#   <root>/snap-.../manifest.json    format version, counts, model, content hashes,
+#                                    sha256 and size of every data file
+#   <root>/snap-.../vectors.npy      float32 (count, dim), L2-normalized, uncompressed so it can be mmapped
+#   <root>/snap-.../chunks.jsonl     one chunk dict per row, same order as vectors
+# A version directory is self-contained: copy it into another root and load it there.
+CURRENT_FILE = "CURRENT"
+DATA_FILES = ("vectors.npy", "chunks.jsonl")
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def set_current(root: str, version: str):
+    """Atomically point <root>/CURRENT at an existing version directory"""
+    if not os.path.isfile(os.path.join(root, version, "manifest.json")):
+        raise SnapshotError(f"No snapshot version {version} in {root}")
+    pointer_tmp = os.path.join(root, f".{CURRENT_FILE}.{uuid.uuid4().hex[:8]}")
+    with open(pointer_tmp, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer_tmp, os.path.join(root, CURRENT_FILE))
+
+
+def write_snapshot(root: str, chunks: List[dict], vectors: np.ndarray, document_hashes: dict,
+                   model_name: str = "", extra: Optional[dict] = None, make_current: bool = True) -> str:
+    """Write a new snapshot version and (by default) atomically point CURRENT at it. Returns the version dir."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if len(chunks) != len(vectors):
+        raise SnapshotError(f"{len(chunks)} chunks but {len(vectors)} vectors")
+
+    os.makedirs(root, exist_ok=True)
+    # Microseconds keep names in creation order (prune_snapshots sorts by name) within a second
+    now = time.time()
+    version = f"snap-{time.strftime('%Y%m%dT%H%M%S', time.localtime(now))}{int(now * 1e6) % 1000000:06d}-{uuid.uuid4().hex[:8]}"
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+    with open(os.path.join(tmp_dir, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "version": version,
+        "created_at": time.time(),
+        "model": model_name,
+        "count": len(chunks),
+        "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "document_hashes": document_hashes,
+        "files": {
+            name: {"sha256": _file_sha256(os.path.join(tmp_dir, name)),
+                   "bytes": os.path.getsize(os.path.join(tmp_dir, name))}
+            for name in DATA_FILES
+        },
+        **(extra or {})
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    version_dir = os.path.join(root, version)
+    os.rename(tmp_dir, version_dir)
+    if make_current:
+        set_current(root, version)
+    return version_dir
+
+
+def resolve_snapshot(path: str) -> str:
+    """Accept either a snapshot root (follows CURRENT) or a version directory"""
+    pointer = os.path.join(path, CURRENT_FILE)
+    if os.path.isfile(pointer):
+        with open(pointer) as f:
+            return os.path.join(path, f.read().strip())
+    if os.path.isfile(os.path.join(path, "manifest.json")):
+        return path
+    raise SnapshotError(f"No index snapshot found at {path}")
+
+
+def verify_snapshot(version_dir: str, manifest: dict):
+    """Check every data file against the manifest's size and sha256; raises SnapshotError"""
+    for name, expected in manifest.get("files", {}).items():
+        path = os.path.join(version_dir, name)
+        if not os.path.isfile(path):
+            raise SnapshotError(f"Snapshot {version_dir} is missing {name}")
+        if os.path.getsize(path) != expected["bytes"]:
+            raise SnapshotError(f"Snapshot {version_dir}: {name} has the wrong size")
+        if _file_sha256(path) != expected["sha256"]:
+            raise SnapshotError(f"Snapshot {version_dir}: {name} failed its checksum")
+
+
+def load_snapshot(path: str, mmap: bool = False, verify: bool = True):
+    """Returns (manifest, chunks, vectors) for the snapshot at `path`.
+
+    With mmap=True the vectors are a read-only np.memmap: loading costs no copy and pages
+    are read on first use. Checksums (format 2+) are verified first unless verify=False.
+    """
+    version_dir = resolve_snapshot(path)
+    with open(os.path.join(version_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get("format_version") not in READABLE_FORMAT_VERSIONS:
+        raise SnapshotError(f"Unsupported snapshot format {manifest.get('format_version')}")
+    if verify:
+        verify_snapshot(version_dir, manifest)
+
+    vectors = np.load(os.path.join(version_dir, "vectors.npy"), mmap_mode="r" if mmap else None)
+    with open(os.path.join(version_dir, "chunks.jsonl"), encoding="utf-8") as f:
+        chunks = [json.loads(line) for line in f if line.strip()]
+    if len(chunks) != len(vectors) or len(chunks) != manifest["count"]:
+        raise SnapshotError(f"Snapshot {version_dir} is inconsistent")
+    return manifest, chunks, vectors
+
+
+def prune_snapshots(root: str, keep: int = 2):
+    """Delete all but the newest `keep` versions, never the one CURRENT points at"""
+    try:
+        current = os.path.basename(resolve_snapshot(root))
+    except SnapshotError:
+        current = None
+    versions = sorted(d for d in os.listdir(root) if d.startswith("snap-"))
+    for version in versions[:-keep] if keep else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
@@ -0,0 +1,218 @@
+"""Build an index snapshot offline from a directory of policy documents.
+
+    python ingest.py ./policies --out ./index_snapshots --workers 8
+
+Files are hashed and extracted in a process pool, chunks are encoded in large
+batches in this process, and the result is written as a new snapshot version
+under --out that the server loads at startup (INDEX_SNAPSHOT_DIR) or on reload.
+Per-file results are kept in --out/.ingest-work until the snapshot is written,
+so an interrupted run resumes where it stopped. Files whose content hash is
+already in the current snapshot are skipped.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+from utils import extract_segments, chunk_segments
+from index_snapshot import write_snapshot, load_snapshot, prune_snapshots, SnapshotError
+from encoders import load_encoder, EMBEDDING_MODEL_NAME
+import tracing
+from tracing import start_span
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("ingest")
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def try_file_sha256(path: str):
+    """file_sha256 for pool.map: one unreadable file shouldn't abort the whole run"""
+    try:
+        return file_sha256(path)
+    except OSError as e:
+        return e
+
+
+def extract_file(path: str, content_hash: str, trace_carrier: dict = None) -> dict:
+    """Runs in a worker process: extract and chunk one file whose hash is already known"""
+    with start_span("ingest.extract_file", parent=tracing.extract(trace_carrier), path=path) as span:
+        segments = extract_segments(path)
+        span.set_attribute("segments", len(segments))
+        return {
+            "path": path,
+            "filename": os.path.basename(path),
+            "content_hash": content_hash,
+            "chunks": chunk_segments(segments)
+        }
+
+
+def discover(directory: str) -> list:
+    paths = []
+    for dirpath, _, filenames in os.walk(directory):
+        for name in filenames:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith("."):
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
+
+
+class WorkDir:
+    """Per-file results (<hash>.json + <hash>.npy) written atomically, so reruns can resume"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def done_hashes(self) -> set:
+        return {name[:-5] for name in os.listdir(self.path)
+                if name.endswith(".json") and os.path.exists(os.path.join(self.path, name[:-5] + ".npy"))}
+
+    def save(self, result: dict, vectors: np.ndarray):
+        base = os.path.join(self.path, result["content_hash"])
+        np.save(base + ".npy.tmp.npy", vectors.astype(np.float32))
+        os.replace(base + ".npy.tmp.npy", base + ".npy")
+        meta = {k: result[k] for k in ("filename", "content_hash", "chunks")}
+        with open(base + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(base + ".json.tmp", base + ".json")
+
+    def load(self, content_hash: str):
+        base = os.path.join(self.path, content_hash)
+        with open(base + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return meta, np.load(base + ".npy")
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
+        os.rmdir(self.path)
+
+
+def encode_pending(encoder, pending: list, work: WorkDir, batch_size: int):
+    texts = [chunk["content"] for result in pending for chunk in result["chunks"]]
+    with start_span("ingest.encode", files=len(pending), chunks=len(texts)):
+        vectors = encoder.encode(texts, batch_size=batch_size) if texts else np.empty((0, 384), dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    offset = 0
+    for result in pending:
+        n = len(result["chunks"])
+        work.save(result, vectors[offset:offset + n])
+        offset += n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="Directory of PDF/DOCX/TXT policy documents")
+    parser.add_argument("--out", default="index_snapshots", help="Snapshot root directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Extraction processes")
+    parser.add_argument("--encode-chunks", type=int, default=2048,
+                        help="Chunks accumulated before each encoder call")
+    parser.add_argument("--batch-size", type=int, default=128, help="Encoder batch size")
+    parser.add_argument("--keep", type=int, default=2, help="Snapshot versions to keep")
+    args = parser.parse_args()
+
+    start = time.time()
+    chunks, vectors, document_hashes = [], [], {}
+    try:
+        manifest, chunks, existing = load_snapshot(args.out)
+        vectors = [existing]
+        document_hashes = dict(manifest.get("document_hashes", {}))
+        logger.info(f"Extending snapshot {manifest['version']} ({len(chunks)} chunks, {len(document_hashes)} documents)")
+    except (SnapshotError, FileNotFoundError):
+        logger.info(f"No existing snapshot in {args.out}; building a new one")
+
+    work = WorkDir(os.path.join(args.out, ".ingest-work"))
+    done = work.done_hashes()
+    paths = discover(args.directory)
+    logger.info(f"Found {len(paths)} documents, {len(done)} already processed in an earlier run")
+
+    encoder = None
+    pending, pending_chunks, seen, processed = [], 0, set(document_hashes) | done, 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        # Hash everything first (cheap) so already indexed or duplicate files are never parsed
+        to_extract = []
+        with start_span("ingest.hash", files=len(paths)):
+            hashes = pool.map(try_file_sha256, paths, chunksize=max(1, len(paths) // (4 * (args.workers or 1))))
+            for path, content_hash in zip(paths, hashes):
+                if isinstance(content_hash, OSError):
+                    logger.error(f"{path}: could not read: {content_hash}")
+                    continue
+                if content_hash in seen:
+                    logger.info(f"{path}: already indexed or a duplicate, skipping")
+                    continue
+                seen.add(content_hash)
+                to_extract.append((path, content_hash))
+        logger.info(f"{len(to_extract)} of {len(paths)} documents need extraction")
+        if to_extract:
+            encoder = load_encoder()
+
+        # Workers continue this run's trace from the traceparent they are handed
+        carrier = tracing.inject()
+        futures = {pool.submit(extract_file, path, content_hash, carrier): path for path, content_hash in to_extract}
+        for future in as_completed(futures):
+            path = futures[future]
+            processed += 1
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"[{processed}/{len(to_extract)}] {path}: extraction failed: {e}")
+                continue
+            if not result["chunks"]:
+                logger.warning(f"[{processed}/{len(to_extract)}] {path}: no text extracted")
+                continue
+
+            logger.info(f"[{processed}/{len(to_extract)}] {path}: {len(result['chunks'])} chunks")
+            pending.append(result)
+            pending_chunks += len(result["chunks"])
+            if pending_chunks >= args.encode_chunks:
+                encode_pending(encoder, pending, work, args.batch_size)
+                pending, pending_chunks = [], 0
+    if pending:
+        encode_pending(encoder, pending, work, args.batch_size)
+
+    new_hashes = sorted(work.done_hashes() - set(document_hashes))
+    if not new_hashes:
+        logger.info("Nothing new to index")
+        work.clear()
+        return
+
+    for content_hash in new_hashes:
+        meta, file_vectors = work.load(content_hash)
+        document_id = str(uuid.uuid4())
+        for chunk in meta["chunks"]:
+            chunks.append({
+                "id": f"{document_id}_{len(chunks)}",
+                **chunk,
+                "filename": meta["filename"],
+                "document_id": document_id
+            })
+        vectors.append(file_vectors)
+        document_hashes[content_hash] = document_id
+
+    matrix = np.vstack(vectors).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+    with start_span("ingest.write_snapshot", chunks=len(chunks)):
+        version_dir = write_snapshot(args.out, chunks, matrix, document_hashes, model_name=EMBEDDING_MODEL_NAME)
+    work.clear()
+    prune_snapshots(args.out, keep=args.keep)
+    logger.info(f"Wrote {version_dir}: {len(new_hashes)} new documents, {len(chunks)} chunks "
+                f"in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    with start_span("ingest.run"):
+        main()
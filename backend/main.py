@@ -1,17 +1,30 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List
-import shutil, os, uuid, json, time, re, logging, asyncio
+from collections import Counter
+import os, uuid, json, time, logging, asyncio, hashlib, threading, weakref
+import urllib.request, urllib.parse, urllib.error, http.client, ipaddress, socket, zipfile, io
 from concurrent.futures import ThreadPoolExecutor
-from sentence_transformers import SentenceTransformer
+from encoders import load_encoder, EMBEDDING_MODEL_NAME
 import numpy as np
-import PyPDF2, docx
 import google.generativeai as genai
+from response_parser import generate_json, parse_stats, CLAIM_SCHEMA, ANSWERS_SCHEMA
+from vector_index import VectorIndex
+from sharded_index import ShardedIndex
+from index_snapshot import load_snapshot, write_snapshot, set_current, SnapshotError
+from singleflight import SingleFlight
+from admission import AdmissionController, Overloaded, LANES
+from utils import extract_segments, chunk_segments
+import tracing
+from tracing import start_span
+from upload_stream import StreamingUpload, UploadRejected, check_declared_length, WRITE_BUFFER_BYTES
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s%(trace)s")
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(tracing.TraceLogFilter())
 logger = logging.getLogger(__name__)
 
 app = FastAPI()
@@ -31,9 +44,73 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-documents, embeddings = [], []
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request, continuing the caller's trace when a traceparent header is sent"""
+    parent = tracing.extract(request.headers)
+    with start_span(f"{request.method} {request.url.path}", parent=parent,
+                    **{"http.method": request.method, "http.target": request.url.path}) as span:
+        response = await call_next(request)
+        span.set_attribute("http.status_code", response.status_code)
+        if response.status_code >= 500:
+            span.status = "ERROR"
+        response.headers["traceparent"] = tracing.format_traceparent(span.context)
+        return response
+
+EMBEDDING_DIM = 384
+# float32 (exact), float16 (half memory) or int8 (quarter memory, rescored in float32)
+EMBEDDING_INDEX_DTYPE = os.getenv("EMBEDDING_INDEX_DTYPE", "float32")
+
+# documents[i] is the chunk whose vector is row i of embeddings
+documents = []
+embeddings = VectorIndex(dim=EMBEDDING_DIM, dtype=EMBEDDING_INDEX_DTYPE)
+index_lock = threading.Lock()
 embedding_model = None
-MAX_DOCUMENTS = 1000
+
+# INDEX_SHARDS > 0 partitions vectors by document across that many worker processes;
+# `embeddings` is then unused and sharded search results are resolved via chunk_lookup
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "0"))
+sharded_index = None
+chunk_lookup = {}
+MAX_DOCUMENTS = int(os.getenv("MAX_DOCUMENTS", "1000"))
+
+# Snapshot root written by ingest.py and /admin/index/export; loaded at startup and on
+# /admin/index/reload or /admin/index/load
+INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Version directory name of the snapshot currently being served, if any
+loaded_snapshot = None
+
+# sha256 of raw document bytes -> document_id, so identical uploads reuse the index
+document_hashes = {}
+# content hash -> (document_id, asyncio.Future) for uploads and URL ingests still being
+# processed, so overlapping identical documents share one ingest instead of each embedding
+# the file. The future resolves when the worker thread finishes, which is also when the
+# entry is removed; a caller that stops waiting (timeout, disconnect) doesn't clear it early.
+_pending_ingests = {}
+
+# document_id -> {"status": "processing" | "ready" | "failed", "chunks": int}
+document_status = {}
+# Bumped whenever the searchable chunk set changes; clients key caches on it
+index_version = 0
+
+HACKRX_DEADLINE_SECONDS = float(os.getenv("HACKRX_DEADLINE_SECONDS", "25"))
+HACKRX_QUESTIONS_PER_PROMPT = int(os.getenv("HACKRX_QUESTIONS_PER_PROMPT", "4"))
+HACKRX_TOP_K = int(os.getenv("HACKRX_TOP_K", "3"))
+HACKRX_MAX_DOWNLOAD_BYTES = 25 * 1024 * 1024
+# Bearer token required by /hackrx/run (falls back to ADMIN_TOKEN; the endpoint is off without either)
+HACKRX_TOKEN = os.getenv("HACKRX_TOKEN", "") or ADMIN_TOKEN
+
+# Admission control for the claim path: slots shared by all lanes, per-lane queue bounds
+# and default deadlines (overridable per request with X-Request-Timeout, in seconds)
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("ADMISSION_MAX_CONCURRENT", "4")),
+    max_queue={
+        "interactive": int(os.getenv("ADMISSION_QUEUE_INTERACTIVE", "32")),
+        "batch": int(os.getenv("ADMISSION_QUEUE_BATCH", "64"))
+    }
+)
+LANE_TIMEOUTS = {"interactive": 30.0, "batch": 120.0}
 
 # Validate API key exists
 api_key = os.getenv("GOOGLE_API_KEY")
@@ -46,6 +123,18 @@ class QueryRequest(BaseModel):
     query: str
     policy_number: Optional[str] = ""
 
+class HackRxRequest(BaseModel):
+    documents: str
+    questions: List[str]
+
+class SnapshotExportRequest(BaseModel):
+    make_current: bool = True
+
+class SnapshotLoadRequest(BaseModel):
+    version: Optional[str] = None
+    verify: bool = True
+    make_current: bool = True
+
 class ClaimResponse(BaseModel):
     claim_id: str
     decision: str
@@ -53,165 +142,411 @@ class ClaimResponse(BaseModel):
     justification: str
     confidence_score: float
     processing_time: float
+    queue_time: float = 0.0
 
 def init_model():
     global embedding_model
     if embedding_model is None:
-        embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        embedding_model = load_encoder()
 
-def cleanup_old_documents():
-    global documents, embeddings
-    if len(documents) > MAX_DOCUMENTS:
-        logger.info(f"Cleaning up old documents. Current count: {len(documents)}")
+def cleanup_old_documents() -> List[str]:
+    """Caller must hold index_lock. In sharded mode, returns the evicted document_ids; the
+    caller removes them from the shards after releasing the lock (removal may rebalance)."""
+    global documents
+    if len(documents) <= MAX_DOCUMENTS:
+        return []
+    logger.info(f"Cleaning up old documents. Current count: {len(documents)}")
+    evicted = []
+    if sharded_index is not None:
+        # Shards hold whole documents, so evict whole documents oldest first until under the
+        # cap, but never the newest: one ingest can exceed MAX_DOCUMENTS on its own
+        counts = Counter(d["document_id"] for d in documents)
+        newest, remaining_rows = documents[-1]["document_id"], len(documents)
+        for document_id, count in counts.items():
+            if remaining_rows <= MAX_DOCUMENTS or document_id == newest:
+                break
+            evicted.append(document_id)
+            remaining_rows -= count
+        evicted_set = set(evicted)
+        for d in documents:
+            if d["document_id"] in evicted_set:
+                chunk_lookup.pop(d["id"], None)
+        documents = [d for d in documents if d["document_id"] not in evicted_set]
+    else:
         documents = documents[-MAX_DOCUMENTS:]
-        embeddings = embeddings[-MAX_DOCUMENTS:]
-
-def extract_text_pdf(path: str) -> str:
-    text = ""
-    try:
-        with open(path, "rb") as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                text += page.extract_text() or ""
-    except PyPDF2.PdfReadError as e:
-        logger.error(f"PDF reading failed for {path}: {e}")
-    except Exception as e:
-        logger.error(f"Unexpected error reading PDF {path}: {e}")
-    return text
-
-def extract_text_docx(path: str) -> str:
-    try:
-        doc = docx.Document(path)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception as e:
-        logger.error(f"DOCX reading failed for {path}: {e}")
-        return ""
-
-def chunk_text(text: str, chunk_size: int=1000, overlap: int=200) -> List[str]:
-    chunks, start = [], 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - overlap
-    return chunks
-
-def _process_document_sync(document_id: str, path: str, filename: str):
+        embeddings.keep_last(MAX_DOCUMENTS)
+    # Forget hashes and status of documents with no chunks left so they get re-ingested next time
+    remaining = {d["document_id"] for d in documents}
+    for content_hash in [h for h, doc_id in document_hashes.items() if doc_id not in remaining]:
+        del document_hashes[content_hash]
+    for document_id in [doc_id for doc_id, status in document_status.items()
+                        if status.get("status") == "ready" and doc_id not in remaining]:
+        del document_status[document_id]
+    return evicted
+
+def remove_document(document_id: str) -> int:
+    """Drop every chunk of a document from the index. Returns the number of chunks removed."""
+    global documents, index_version
+    with index_lock:
+        keep = [d["document_id"] != document_id for d in documents]
+        removed = len(keep) - sum(keep)
+        if sharded_index is not None:
+            for d in documents:
+                if d["document_id"] == document_id:
+                    chunk_lookup.pop(d["id"], None)
+        else:
+            embeddings.keep(np.array(keep, dtype=bool))
+        documents = [d for d, k in zip(documents, keep) if k]
+        for content_hash in [h for h, doc_id in document_hashes.items() if doc_id == document_id]:
+            del document_hashes[content_hash]
+        document_status.pop(document_id, None)
+        index_version += 1
+    if sharded_index is not None:
+        # Outside index_lock: may move other documents between shards to rebalance
+        sharded_index.remove_document(document_id)
+    return removed
+
+def _process_document_sync(document_id: str, path: str, filename: str, content_hash: Optional[str] = None):
     """Synchronous version for thread executor"""
-    if filename.lower().endswith('.pdf'):
-        text = extract_text_pdf(path)
-    elif filename.lower().endswith('.docx'):
-        text = extract_text_docx(path)
-    else:
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                text = f.read()
-        except Exception as e:
-            logger.error(f"Text file reading failed for {path}: {e}")
-            text = ""
+    global index_version
+    document_status[document_id] = {"status": "processing", "chunks": 0}
+    with start_span("document.extract", filename=filename) as span:
+        segments = extract_segments(path, filename)
+        span.set_attribute("segments", len(segments))
     
-    if not text.strip():
+    if not segments:
         logger.warning(f"No text extracted from {filename}")
+        document_status[document_id] = {"status": "failed", "chunks": 0}
         return
     
-    init_model()
-    chunks = chunk_text(text)
-    embeddings_local = embedding_model.encode(chunks)
-    
-    for chunk, emb in zip(chunks, embeddings_local):
-        documents.append({
-            "id": f"{document_id}_{len(documents)}",
-            "content": chunk,
-            "filename": filename,
-            "document_id": document_id
-        })
-        embeddings.append(emb)
+    chunks = chunk_segments(segments)
+    with start_span("document.encode", chunks=len(chunks)):
+        init_model()
+        embeddings_local = embedding_model.encode([c["content"] for c in chunks])
     
-    cleanup_old_documents()
+    with start_span("index.add", chunks=len(chunks), sharded=sharded_index is not None), index_lock:
+        new_chunks = []
+        for chunk in chunks:
+            new_chunks.append({
+                "id": f"{document_id}_{len(documents) + len(new_chunks)}",
+                **chunk,
+                "filename": filename,
+                "document_id": document_id
+            })
+        documents.extend(new_chunks)
+        if sharded_index is not None:
+            chunk_lookup.update((c["id"], c) for c in new_chunks)
+            sharded_index.add_document(document_id, [c["id"] for c in new_chunks], embeddings_local)
+        else:
+            embeddings.add(embeddings_local)
+        
+        if content_hash:
+            document_hashes[content_hash] = document_id
+        evicted = cleanup_old_documents()
+    if evicted:
+        for old_id in evicted:
+            sharded_index.remove_document(old_id, rebalance=False)
+        sharded_index.rebalance()
+    index_version += 1
+    document_status[document_id] = {"status": "ready", "chunks": len(chunks)}
     logger.info(f"Processed {filename}: {len(chunks)} chunks created")
 
-async def process_document(document_id: str, path: str, filename: str):
+async def process_document(document_id: str, path: str, filename: str, content_hash: Optional[str] = None):
     loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        await loop.run_in_executor(executor, _process_document_sync, document_id, path, filename)
-
-def semantic_search(query: str, top_k: int=5) -> List[dict]:
-    if not documents: 
-        return []
+    with start_span("document.process", document_id=document_id, filename=filename) as span, \
+            ThreadPoolExecutor() as executor:
+        try:
+            # bind() carries the current span into the worker thread
+            await loop.run_in_executor(
+                executor, tracing.bind(_process_document_sync), document_id, path, filename, content_hash
+            )
+        except Exception as e:
+            span.record_exception(e)
+            logger.error(f"Processing failed for {filename}: {e}")
+            document_status[document_id] = {"status": "failed", "chunks": 0}
+        finally:
+            pending = _pending_ingests.get(content_hash) if content_hash else None
+            if pending and pending[0] == document_id:
+                del _pending_ingests[content_hash]
+                pending[1].set_result(document_id)
+
+def _build_sharded_index(chunks: List[dict], vectors: np.ndarray) -> ShardedIndex:
+    index = ShardedIndex(INDEX_SHARDS, dim=EMBEDDING_DIM, dtype=EMBEDDING_INDEX_DTYPE)
+    rows_by_document = {}
+    for row, chunk in enumerate(chunks):
+        rows_by_document.setdefault(chunk["document_id"], []).append(row)
+    for document_id, rows in rows_by_document.items():
+        index.add_document(document_id, [chunks[r]["id"] for r in rows], vectors[rows])
+    return index
+
+def swap_index(chunks: List[dict], vectors: np.ndarray, hashes: dict):
+    """Replace the whole searchable index in one step; in-flight searches keep their snapshot"""
+    global documents, embeddings, sharded_index, chunk_lookup, index_version
+    old_sharded = None
+    if sharded_index is not None:
+        new_sharded = _build_sharded_index(chunks, vectors)
+    else:
+        # Snapshot vectors are already normalized; a float32 index maps them without a copy
+        new_index = VectorIndex.from_normalized(vectors, dtype=EMBEDDING_INDEX_DTYPE)
+    if len(chunks) > MAX_DOCUMENTS:
+        logger.warning(f"Loaded index has {len(chunks)} chunks; MAX_DOCUMENTS={MAX_DOCUMENTS} will trim it on the next upload")
     
-    init_model()
-    query_emb = embedding_model.encode([query])[0]
-    similarities = []
+    with index_lock:
+        documents = list(chunks)
+        if sharded_index is not None:
+            old_sharded, sharded_index = sharded_index, new_sharded
+            chunk_lookup = {c["id"]: c for c in chunks}
+        else:
+            embeddings = new_index
+        document_hashes.clear()
+        document_hashes.update(hashes)
+        # Documents not in the new index must stop reporting "ready"; ingests still running
+        # keep their entry and add themselves to the new index when they finish
+        in_progress = {k: v for k, v in document_status.items() if v["status"] == "processing"}
+        document_status.clear()
+        for document_id, count in Counter(c["document_id"] for c in chunks).items():
+            document_status[document_id] = {"status": "ready", "chunks": count}
+        document_status.update(in_progress)
+        index_version += 1
+    if old_sharded is not None:
+        old_sharded.close()
+
+def load_index_snapshot(path: str, verify: bool = True) -> dict:
+    """Verify and load a snapshot, then swap it in. Vectors are memory-mapped unless sharded
+    (shard workers need their own copy). Searches already running finish on the old index,
+    which is released when the last of them drops its reference."""
+    global loaded_snapshot
+    start = time.time()
+    manifest, chunks, vectors = load_snapshot(path, mmap=sharded_index is None, verify=verify)
+    if manifest.get("dim", EMBEDDING_DIM) != EMBEDDING_DIM:
+        raise SnapshotError(f"Snapshot has {manifest['dim']}-dim vectors, expected {EMBEDDING_DIM}")
+    if manifest.get("model") and manifest["model"] != EMBEDDING_MODEL_NAME:
+        logger.warning(f"Snapshot {manifest['version']} was built with {manifest['model']}, serving {EMBEDDING_MODEL_NAME}")
+    if isinstance(vectors, np.memmap):
+        weakref.finalize(vectors, logger.info, f"Released index snapshot {manifest['version']}")
+    loaded = time.time()
+    swap_index(chunks, vectors, manifest.get("document_hashes", {}))
+    loaded_snapshot = manifest["version"]
+    logger.info(f"Loaded index snapshot {manifest['version']}: {manifest['count']} chunks "
+                f"(load {loaded - start:.3f}s, swap {time.time() - loaded:.3f}s)")
+    return manifest
+
+def export_index_snapshot(make_current: bool = True) -> dict:
+    """Write the live index to a new version under INDEX_SNAPSHOT_DIR. Returns its manifest."""
+    global loaded_snapshot
+    with index_lock:
+        docs = documents
+        hashes = dict(document_hashes)
+        index, snapshot = embeddings, embeddings.snapshot()
+    docs = docs[:len(snapshot[0])] if sharded_index is None else list(docs)
     
-    for idx, emb in enumerate(embeddings):
-        sim = np.dot(query_emb, emb) / (np.linalg.norm(query_emb) * np.linalg.norm(emb))
-        similarities.append((sim, idx))
+    if sharded_index is not None:
+        by_key = {}
+        for document_id in dict.fromkeys(d["document_id"] for d in docs):
+            keys, vectors = sharded_index.export_document(document_id)
+            by_key.update(zip(keys, vectors))
+        docs = [d for d in docs if d["id"] in by_key]
+        vectors = np.array([by_key[d["id"]] for d in docs], dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    else:
+        vectors = index.vectors(snapshot=snapshot)
+    # Quantized indexes dequantize to approximately unit rows; snapshots store exact unit rows
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    
+    version_dir = write_snapshot(INDEX_SNAPSHOT_DIR, docs, vectors, hashes,
+                                 model_name=EMBEDDING_MODEL_NAME, make_current=make_current)
+    with open(os.path.join(version_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if make_current:
+        loaded_snapshot = manifest["version"]
+    logger.info(f"Exported index snapshot {manifest['version']}: {manifest['count']} chunks")
+    return manifest
+
+def search_by_vectors(query_embs: np.ndarray, top_k: int=5, document_id: Optional[str]=None) -> List[List[dict]]:
+    """Rank chunks for a batch of already-encoded queries with one matrix product"""
+    if not documents:
+        return [[] for _ in range(len(query_embs))]
+    
+    if sharded_index is not None:
+        lookup = chunk_lookup
+        return [
+            [
+                {
+                    "content": lookup[key]["content"],
+                    "filename": lookup[key]["filename"],
+                    "document_id": lookup[key]["document_id"],
+                    "page": lookup[key].get("page"),
+                    "section": lookup[key].get("section"),
+                    "similarity": sim
+                }
+                for sim, key in row if key in lookup
+            ]
+            for row in sharded_index.search(query_embs, top_k=top_k, document_id=document_id)
+        ]
+    
+    # Take the chunk list and vectors together so a concurrent ingest or swap can't misalign them.
+    # documents only grows in place (every other change rebinds it), so rows below the
+    # snapshot's length stay aligned without copying the list under the lock.
+    with index_lock:
+        docs = documents
+        index, snapshot = embeddings, embeddings.snapshot()
+    n = len(snapshot[0])
+    rows = None
+    if document_id is not None:
+        rows = [i for i in range(n) if docs[i]["document_id"] == document_id]
+        if not rows:
+            return [[] for _ in range(len(query_embs))]
     
-    similarities.sort(reverse=True)
+    scores, indices = index.search(query_embs, top_k=top_k, rows=rows, snapshot=snapshot)
     return [
-        {
-            "content": documents[idx]["content"],
-            "filename": documents[idx]["filename"],
-            "similarity": float(sim)
-        }
-        for sim, idx in similarities[:top_k]
+        [
+            {
+                "content": docs[i]["content"],
+                "filename": docs[i]["filename"],
+                "document_id": docs[i]["document_id"],
+                "page": docs[i].get("page"),
+                "section": docs[i].get("section"),
+                "similarity": float(sim)
+            }
+            for sim, i in zip(row_scores, row_indices)
+        ]
+        for row_scores, row_indices in zip(scores, indices)
     ]
 
-def extract_and_parse_json(text: str) -> dict:
-    """Robust JSON extraction from AI response"""
-    # Remove markdown code blocks
-    text = re.sub(r'```json\s*', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'```\s*$', '', text.strip())
-    
-    # Try to find JSON object
-    json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', text, re.DOTALL)
-    
-    if json_match:
-        try:
-            return json.loads(json_match.group())
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e}")
+def semantic_search(query: str, top_k: int=5, document_id: Optional[str]=None) -> List[dict]:
+    if not documents: 
+        return []
     
-    # Fallback: try parsing the entire text as JSON
-    try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        logger.warning(f"Could not parse AI response as JSON: {text[:100]}...")
-        return {"coverage": "REVIEW", "reason": "Could not parse AI response"}
+    with start_span("search", top_k=top_k, document_id=document_id) as span:
+        init_model()
+        with start_span("search.encode_query"):
+            query_emb = embedding_model.encode([query])
+        results = search_by_vectors(query_emb, top_k=top_k, document_id=document_id)[0]
+        span.set_attribute("scores", [round(r["similarity"], 4) for r in results])
+        return results
 
 @app.post("/upload-document")
-async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_document(request: Request, background_tasks: BackgroundTasks):
+    upload = None
     try:
-        if not file.filename:
-            raise HTTPException(status_code=400, detail="No filename provided")
+        check_declared_length(request.headers.get("content-length"))
         
         os.makedirs("uploads", exist_ok=True)
         document_id = str(uuid.uuid4())
-        path = os.path.join("uploads", f"{document_id}_{file.filename}")
+        upload = StreamingUpload(
+            request.headers.get("content-type", ""),
+            os.path.join("uploads", f"{document_id}.part")
+        )
+        
+        # Parse the multipart body as it arrives so bad uploads are rejected early
+        async for chunk in request.stream():
+            upload.feed(chunk)
+            if upload.pending_bytes >= WRITE_BUFFER_BYTES:
+                await run_in_threadpool(upload.flush)
+        await run_in_threadpool(upload.close)
+        
+        if not upload.finished or upload.filename is None:
+            raise UploadRejected(400, "No file provided")
         
-        with open(path, "wb") as out:
-            shutil.copyfileobj(file.file, out)
+        pending = _pending_ingests.get(upload.content_hash)
+        if pending:
+            upload.discard()
+            logger.info(f"Upload of {upload.filename} matches in-flight document {pending[0]}")
+            return {"document_id": pending[0], "status": "processing", "filename": upload.filename}
         
-        background_tasks.add_task(process_document, document_id, path, file.filename)
+        existing_id = document_hashes.get(upload.content_hash)
+        if existing_id:
+            upload.discard()
+            logger.info(f"Upload of {upload.filename} matches indexed document {existing_id}")
+            return {
+                "document_id": existing_id,
+                "status": "indexed",
+                "filename": upload.filename,
+                "index_version": index_version
+            }
+        
+        path = os.path.join("uploads", f"{document_id}_{upload.filename}")
+        os.replace(upload.dest_path, path)
+        
+        document_status[document_id] = {"status": "processing", "chunks": 0}
+        _pending_ingests[upload.content_hash] = (document_id, asyncio.get_running_loop().create_future())
+        background_tasks.add_task(process_document, document_id, path, upload.filename, upload.content_hash)
         return {
             "document_id": document_id, 
             "status": "processing",
-            "filename": file.filename
+            "filename": upload.filename
         }
+    except UploadRejected as e:
+        if upload is not None:
+            upload.discard()
+        logger.warning(f"Upload rejected: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
+        if upload is not None:
+            upload.discard()
         logger.error(f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/process-claim", response_model=ClaimResponse)
-async def process_claim(request: QueryRequest):
-    start = time.time()
-    
+# Concurrent identical claims (double submits, several adjusters) share one pipeline run
+claim_flight = SingleFlight()
+
+def claim_key(request: QueryRequest, lane: str) -> tuple:
+    # The lane is part of the key so an interactive claim never waits behind a batch leader
+    normalized = " ".join(request.query.casefold().split())
+    return (normalized, (request.policy_number or "").strip().casefold(), index_version, lane)
+
+def request_lane(request: Request, default: str) -> tuple:
+    """(lane, monotonic deadline) from X-Priority / X-Request-Timeout headers"""
+    lane = request.headers.get("x-priority", default).lower()
+    if lane not in LANES:
+        lane = default
     try:
-        relevant_docs = semantic_search(request.query, top_k=5)
-        context = "\n---\n".join([d["content"] for d in relevant_docs])
-        
-        prompt = f"""You are an insurance expert. Give a SHORT answer (max 2 sentences).
+        timeout = float(request.headers.get("x-request-timeout", LANE_TIMEOUTS[lane]))
+    except ValueError:
+        timeout = LANE_TIMEOUTS[lane]
+    return lane, time.monotonic() + timeout
+
+def overloaded_error(e: Overloaded) -> HTTPException:
+    return HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+async def admitted_claim(query: str, lane: str, deadline: float) -> dict:
+    """Wait for an admission slot, then evaluate; the leader's queue time rides along"""
+    async with admission.slot(lane, deadline) as ticket:
+        with start_span("claim.evaluate", lane=lane, queue_time=round(ticket.queue_time, 4)):
+            result = await evaluate_claim(query)
+        return {**result, "queue_time": ticket.queue_time}
+
+async def coalesced_claim(request: QueryRequest, lane: str, deadline: float) -> tuple:
+    """(result, shared) from the single-flight run for this claim.
+
+    Admission happens inside the shared run with the leader's deadline. If that run is shed
+    while this caller only followed it, retry under this caller's own deadline instead of
+    inheriting the leader's 503/429.
+    """
+    key = claim_key(request, lane)
+    while True:
+        led = []
+
+        def lead():
+            led.append(True)
+            return admitted_claim(request.query, lane, deadline)
+
+        try:
+            return await claim_flight.do(key, lead)
+        except Overloaded:
+            if led or time.monotonic() >= deadline:
+                raise
+            logger.info("Coalesced claim's leader was shed; retrying with its own deadline")
+
+async def evaluate_claim(query: str) -> dict:
+    """Search + Gemini for one claim; returns the ClaimResponse fields shared by duplicates"""
+    # Encode + search is CPU-bound (and blocking IPC when sharded); keep it off the event loop
+    # so queued requests' deadlines and 503s still fire on time
+    relevant_docs = await run_in_threadpool(semantic_search, query, 5)
+    context = "\n---\n".join([d["content"] for d in relevant_docs])
+    
+    prompt = f"""You are an insurance expert. Give a SHORT answer (max 2 sentences).
 
-Claim: {request.query}
+Claim: {query}
 
 Policy: {context}
 
@@ -222,44 +557,121 @@ Return ONLY JSON:
 }}
 
 Keep the reason under 30 words."""
-        
-        model = genai.GenerativeModel(
-            'gemini-1.5-flash',
-            generation_config={"max_output_tokens": 100}
-)
+    
+    parsed = await generate_json('gemini-1.5-flash', prompt, CLAIM_SCHEMA, max_output_tokens=100)
+    
+    # Validate coverage decision
+    coverage = parsed.get("coverage", "REVIEW").upper()
+    if coverage not in ["COVERED", "NOT COVERED", "REVIEW"]:
+        coverage = "REVIEW"
+    
+    return {
+        "decision": coverage,
+        "amount": None,
+        "justification": parsed.get("reason", "No explanation available"),
+        "confidence_score": 0.85
+    }
 
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        
-        parsed = extract_and_parse_json(text)
-        
-        # Validate coverage decision
-        coverage = parsed.get("coverage", "REVIEW").upper()
-        if coverage not in ["COVERED", "NOT COVERED", "REVIEW"]:
-            coverage = "REVIEW"
-        
-        end = time.time()
+@app.post("/process-claim", response_model=ClaimResponse)
+async def process_claim(request: QueryRequest, http_request: Request):
+    start = time.time()
+    lane, deadline = request_lane(http_request, "interactive")
+    
+    try:
+        result, shared = await coalesced_claim(request, lane, deadline)
+        if shared:
+            logger.info("Claim coalesced with an identical in-flight request")
+        span = tracing.current_span()
+        if span is not None:
+            span.set_attribute("claim.coalesced", shared)
         
+        # Timings are this caller's own: a follower never queued, it waited on the shared run
+        queue_time = 0.0 if shared else result["queue_time"]
         return ClaimResponse(
             claim_id=f"CLAIM-{uuid.uuid4()}",
-            decision=coverage,
-            amount=None,
-            justification=parsed.get("reason", "No explanation available"),
-            confidence_score=0.85,
-            processing_time=end - start
+            **{**result, "queue_time": queue_time, "processing_time": time.time() - start - queue_time}
         )
-        
+    
+    except Overloaded as e:
+        logger.warning(f"Claim shed by admission control ({lane}): {e.detail}")
+        raise overloaded_error(e)
     except Exception as e:
+        # A failed pipeline (quota, unparseable model output) is an error, not a REVIEW decision
         logger.error(f"Claim processing failed: {e}")
-        end = time.time()
-        return ClaimResponse(
-            claim_id=f"CLAIM-{uuid.uuid4()}",
-            decision="REVIEW",
-            amount=None,
-            justification=f"Processing error: {str(e)}",
-            confidence_score=0.0,
-            processing_time=end - start
-        )
+        raise HTTPException(status_code=502, detail=f"Claim processing failed: {e}")
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if request.headers.get("authorization", "") != f"Bearer {ADMIN_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+@app.on_event("startup")
+async def load_snapshot_on_startup():
+    global sharded_index
+    if INDEX_SHARDS > 0:
+        # Started here rather than at import: spawned workers re-import this module
+        sharded_index = await run_in_threadpool(ShardedIndex, INDEX_SHARDS, EMBEDDING_DIM, EMBEDDING_INDEX_DTYPE)
+        logger.info(f"Started {INDEX_SHARDS} index shard workers")
+    if INDEX_SNAPSHOT_DIR and os.path.exists(INDEX_SNAPSHOT_DIR):
+        try:
+            await run_in_threadpool(load_index_snapshot, INDEX_SNAPSHOT_DIR)
+        except SnapshotError as e:
+            logger.error(f"Could not load index snapshot: {e}")
+
+@app.on_event("shutdown")
+async def stop_shard_workers():
+    if sharded_index is not None:
+        sharded_index.close()
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str, request: Request):
+    require_admin(request)
+    removed = await run_in_threadpool(remove_document, document_id)
+    if not removed:
+        raise HTTPException(status_code=404, detail="Unknown document_id")
+    return {"document_id": document_id, "removed_chunks": removed, "index_version": index_version}
+
+@app.post("/admin/index/reload")
+async def reload_index_snapshot(request: Request):
+    require_admin(request)
+    if not INDEX_SNAPSHOT_DIR:
+        raise HTTPException(status_code=400, detail="INDEX_SNAPSHOT_DIR is not configured")
+    try:
+        manifest = await run_in_threadpool(load_index_snapshot, INDEX_SNAPSHOT_DIR)
+    except (SnapshotError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": manifest["version"], "chunks": manifest["count"], "index_version": index_version}
+
+@app.post("/admin/index/export")
+async def export_index(request: Request, payload: Optional[SnapshotExportRequest] = None):
+    """Write the live index as a checksummed snapshot version; copy that directory into another
+    server's INDEX_SNAPSHOT_DIR and call /admin/index/load there to promote it"""
+    require_admin(request)
+    if not INDEX_SNAPSHOT_DIR:
+        raise HTTPException(status_code=400, detail="INDEX_SNAPSHOT_DIR is not configured")
+    payload = payload or SnapshotExportRequest()
+    manifest = await run_in_threadpool(export_index_snapshot, payload.make_current)
+    return {"version": manifest["version"], "chunks": manifest["count"], "files": manifest["files"]}
+
+@app.post("/admin/index/load")
+async def load_index(request: Request, payload: SnapshotLoadRequest):
+    """Verify a snapshot version (default: CURRENT) and hot-swap it in without a restart"""
+    require_admin(request)
+    if not INDEX_SNAPSHOT_DIR:
+        raise HTTPException(status_code=400, detail="INDEX_SNAPSHOT_DIR is not configured")
+    if payload.version is not None and (os.path.basename(payload.version) != payload.version
+                                        or not payload.version.startswith("snap-")):
+        raise HTTPException(status_code=400, detail="version must be a snapshot directory name")
+    
+    path = os.path.join(INDEX_SNAPSHOT_DIR, payload.version) if payload.version else INDEX_SNAPSHOT_DIR
+    try:
+        manifest = await run_in_threadpool(load_index_snapshot, path, payload.verify)
+        if payload.version and payload.make_current:
+            await run_in_threadpool(set_current, INDEX_SNAPSHOT_DIR, payload.version)
+    except (SnapshotError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"version": manifest["version"], "chunks": manifest["count"], "index_version": index_version}
 
 @app.get("/")
 def root():
@@ -267,46 +679,291 @@ def root():
 
 @app.get("/health")
 async def health_check():
+    sharded = sharded_index
+    if sharded is not None:
+        # The in-process index is unused when sharded; the workers hold private copies
+        index_info = {
+            "total_chunks": len(sharded),
+            "index_dtype": sharded.dtype,
+            "index_bytes": await run_in_threadpool(sharded.nbytes),
+            "index_mapped": False
+        }
+    else:
+        index_info = {
+            "total_chunks": len(embeddings),
+            "index_dtype": embeddings.dtype,
+            "index_bytes": embeddings.nbytes,
+            "index_mapped": embeddings.mapped
+        }
     return {
         "status": "healthy", 
         "processed_documents": len(documents),
-        "total_chunks": len(embeddings),
-        "embedding_model_loaded": embedding_model is not None
+        **index_info,
+        "index_snapshot": loaded_snapshot,
+        "shard_sizes": sharded.shard_sizes() if sharded is not None else None,
+        "embedding_model_loaded": embedding_model is not None,
+        "index_version": index_version,
+        "response_parse": dict(parse_stats),
+        "claim_coalescing": {**claim_flight.stats, "in_flight": len(claim_flight)},
+        "admission": admission.snapshot()
     }
 
-@app.post("/hackrx/run")
-async def hackrx_run(request: Request):
+def _check_document_url(url: str):
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme not in ("http", "https"):
+        raise ValueError("documents must be an http(s) URL")
+    if not parsed.hostname:
+        raise ValueError("documents URL has no host")
+
+def _create_public_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None, **kwargs):
+    """socket.create_connection that refuses loopback, private, link-local and reserved addresses.
+
+    The check and the connect use the same resolved address, so DNS rebinding between the
+    two can't redirect the fetch to an internal host.
+    """
+    host, port = address
     try:
-        auth_header = request.headers.get("authorization", "")
-        if not auth_header.startswith("Bearer "):
-            # Still proceed — just note it
-            token_status = "missing_or_invalid"
-        else:
-            token_status = "valid"
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"Could not resolve {host}: {e}")
+    for info in infos:
+        ip = ipaddress.ip_address(info[4][0].split("%")[0])
+        if not ip.is_global:
+            raise ValueError(f"Refusing to fetch from non-public address {ip}")
+    error = None
+    for family, socktype, proto, _, sockaddr in infos:
+        sock = socket.socket(family, socktype, proto)
+        try:
+            if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error
+
+class _PublicHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+class _PublicHTTPSConnection(http.client.HTTPSConnection):
+    # TLS still verifies against the URL's hostname; only the TCP connect is pinned
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+class _PublicRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        _check_document_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+# No proxies: the address check must apply to the document host itself
+_document_opener = urllib.request.build_opener(
+    urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _PublicRedirectHandler
+)
 
+def _fetch_document(url: str) -> bytes:
+    _check_document_url(url)
+    with _document_opener.open(url, timeout=HACKRX_DEADLINE_SECONDS) as resp:
+        data = resp.read(HACKRX_MAX_DOWNLOAD_BYTES + 1)
+    if len(data) > HACKRX_MAX_DOWNLOAD_BYTES:
+        raise ValueError("Document exceeds download size limit")
+    return data
+
+def _document_filename(data: bytes, url: str) -> str:
+    """Name the download by its content, not its URL, so extraction picks the right parser"""
+    stem = os.path.splitext(os.path.basename(urllib.parse.urlparse(url).path))[0] or "document"
+    if data.startswith(b"%PDF"):
+        return f"{stem}.pdf"
+    if data.startswith(b"PK\x03\x04"):
         try:
-            data = await request.json()
-        except:
-            data = None
-
-        response_data = {
-            "success": True,
-            "token_status": token_status,
-            "received_data": data,
-            "message": "Request handled successfully"
-        }
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return f"{stem}.docx"
+        except zipfile.BadZipFile:
+            pass
+        raise ValueError("Unsupported archive; expected a PDF, DOCX or text document")
+    try:
+        data[:4096].decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the boundary is still text
+        if e.start < 4090:
+            raise ValueError("Unsupported binary document; expected a PDF, DOCX or text document")
+    return f"{stem}.txt"
+
+def _ingest_bytes_sync(document_id: str, data: bytes, filename: str, content_hash: str) -> str:
+    os.makedirs("uploads", exist_ok=True)
+    path = os.path.join("uploads", f"{document_id}_{filename}")
+    with open(path, "wb") as out:
+        out.write(data)
+    _process_document_sync(document_id, path, filename, content_hash)
+    return document_id
+
+async def ingest_document_url(url: str) -> tuple:
+    """Download and index a document, reusing the existing index when its hash matches.
+    Returns (document_id, reused)."""
+    loop = asyncio.get_event_loop()
+    data = await loop.run_in_executor(None, tracing.bind(_fetch_document), url)
+    filename = _document_filename(data, url)
+    content_hash = hashlib.sha256(data).hexdigest()
+    
+    pending = _pending_ingests.get(content_hash)
+    reused = pending is not None
+    if not reused:
+        if content_hash in document_hashes:
+            return document_hashes[content_hash], True
+        document_id = str(uuid.uuid4())
+        done = loop.run_in_executor(
+            None, tracing.bind(_ingest_bytes_sync), document_id, data, filename, content_hash
+        )
+        pending = _pending_ingests[content_hash] = (document_id, done)
+        done.add_done_callback(lambda future: _finish_ingest(content_hash, document_id, future))
+    # Shielded: a timed-out caller stops waiting, but the ingest (and its entry) lives on
+    # until the thread finishes, so a retry joins it instead of embedding the document again
+    await asyncio.shield(pending[1])
+    return pending[0], reused
+
+def _finish_ingest(content_hash: str, document_id: str, future: asyncio.Future):
+    if _pending_ingests.get(content_hash, (None,))[0] == document_id:
+        del _pending_ingests[content_hash]
+    # Mark a failure as retrieved even if every waiter gave up
+    if not future.cancelled():
+        future.exception()
+
+def build_batch_prompt(questions: List[str], contexts: List[List[dict]]) -> str:
+    blocks = []
+    for i, (question, ctx) in enumerate(zip(questions, contexts), start=1):
+        excerpts = "\n---\n".join([d["content"] for d in ctx]) or "(no relevant text found)"
+        blocks.append(f"Question {i}: {question}\nPolicy excerpts for question {i}:\n{excerpts}")
+    joined = "\n\n".join(blocks)
+    
+    return f"""You are an insurance expert. Answer each question using only its policy excerpts.
 
-        return JSONResponse(content=response_data, status_code=200)
+{joined}
 
-    except Exception as e:
-        return JSONResponse(
-            content={
-                "success": True,
-                "message": "Error handled gracefully",
-                "error": str(e)
-            },
-            status_code=200
-        )
+Return ONLY JSON with exactly {len(questions)} answers in question order:
+{{
+  "answers": ["answer to question 1", "..."]
+}}
+
+Keep each answer under 40 words and cite the policy clause where possible."""
+
+async def _answer_batch(questions: List[str], contexts: List[List[dict]]) -> List[str]:
+    parsed = await generate_json(
+        'gemini-1.5-flash',
+        build_batch_prompt(questions, contexts),
+        ANSWERS_SCHEMA,
+        max_output_tokens=120 * len(questions)
+    )
+    answers = parsed.get("answers")
+    if not isinstance(answers, list):
+        answers = []
+    answers = [str(a) for a in answers[:len(questions)]]
+    return answers + ["Answer not available"] * (len(questions) - len(answers))
+
+@app.get("/documents/{document_id}/status")
+async def document_status_check(document_id: str):
+    status = document_status.get(document_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown document_id")
+    return {"document_id": document_id, **status, "index_version": index_version}
+
+@app.post("/hackrx/run")
+async def hackrx_run(payload: HackRxRequest, request: Request):
+    start = time.time()
+    deadline = start + HACKRX_DEADLINE_SECONDS
+    timings = {}
+    
+    # The endpoint fetches arbitrary URLs, so callers must authenticate before anything is fetched
+    if not HACKRX_TOKEN:
+        raise HTTPException(status_code=403, detail="/hackrx/run is disabled (HACKRX_TOKEN not set)")
+    if request.headers.get("authorization", "") != f"Bearer {HACKRX_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid or missing bearer token")
+    
+    lane, lane_deadline = request_lane(request, "batch")
+    try:
+        # Queue wait counts against the same fixed deadline as the work itself
+        async with admission.slot(lane, min(lane_deadline, time.monotonic() + HACKRX_DEADLINE_SECONDS)) as ticket:
+            timings["queue"] = ticket.queue_time
+            t = time.time()
+            try:
+                document_id, reused = await asyncio.wait_for(
+                    ingest_document_url(payload.documents), timeout=max(0.0, deadline - time.time())
+                )
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=504, detail="Document ingestion exceeded deadline")
+            except Exception as e:
+                logger.error(f"HackRx ingestion failed: {e}")
+                raise HTTPException(status_code=400, detail=f"Could not ingest document: {e}")
+            timings["ingest"] = time.time() - t
+            if document_status.get(document_id, {}).get("chunks", 0) == 0:
+                raise HTTPException(status_code=422, detail="No text could be extracted from the document")
+    
+            questions = payload.questions
+            answers = ["Answer not available within deadline"] * len(questions)
+            if questions:
+                loop = asyncio.get_event_loop()
+                t = time.time()
+                await run_in_threadpool(init_model)
+                with start_span("search.encode_query", questions=len(questions)):
+                    query_embs = await loop.run_in_executor(None, embedding_model.encode, questions)
+                timings["encode"] = time.time() - t
+        
+                t = time.time()
+                with start_span("search", top_k=HACKRX_TOP_K, document_id=document_id) as span:
+                    contexts = await run_in_threadpool(search_by_vectors, query_embs, HACKRX_TOP_K, document_id)
+                    span.set_attribute("scores", [[round(d["similarity"], 4) for d in ctx] for ctx in contexts])
+                timings["search"] = time.time() - t
+        
+                t = time.time()
+                size = max(1, HACKRX_QUESTIONS_PER_PROMPT)
+                batches = {}
+                for offset in range(0, len(questions), size):
+                    task = asyncio.ensure_future(
+                        _answer_batch(questions[offset:offset + size], contexts[offset:offset + size])
+                    )
+                    batches[task] = offset
+        
+                done, pending = await asyncio.wait(batches, timeout=max(0.0, deadline - time.time()))
+                for task in pending:
+                    task.cancel()
+                for task in done:
+                    offset = batches[task]
+                    try:
+                        batch_answers = task.result()
+                    except Exception as e:
+                        logger.error(f"HackRx batch at offset {offset} failed: {e}")
+                        continue
+                    answers[offset:offset + len(batch_answers)] = batch_answers
+                if pending:
+                    logger.warning(f"HackRx deadline hit: {len(pending)} of {len(batches)} batches unanswered")
+                timings["llm"] = time.time() - t
+    
+    except Overloaded as e:
+        logger.warning(f"HackRx request shed by admission control: {e.detail}")
+        raise overloaded_error(e)
+    
+    timings["total"] = time.time() - start
+    logger.info(f"HackRx answered {len(questions)} questions, timings: {timings}")
+    
+    return {
+        "answers": answers,
+        "document_id": document_id,
+        "document_reused": reused,
+        "timings": {stage: round(v, 3) for stage, v in timings.items()}
+    }
 
 if __name__ == "__main__":
     import uvicorn
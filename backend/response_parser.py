@@ -0,0 +1,298 @@
+import json
+import re
+import logging
+from typing import Optional, Iterable
+import google.generativeai as genai
+from tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# Counters surfaced through /health
+parse_stats = {"parsed": 0, "failures": 0, "retries": 0, "retry_successes": 0}
+
+# Schemas passed to Gemini as response_schema where the SDK/model supports it
+CLAIM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "coverage": {"type": "string"},
+        "reason": {"type": "string"}
+    },
+    "required": ["coverage", "reason"]
+}
+
+ANSWERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "answers": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["answers"]
+}
+
+DECISION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "decision": {"type": "string"},
+        "amount": {"type": "number"},
+        "justification": {"type": "string"},
+        "confidence_score": {"type": "number"}
+    },
+    "required": ["decision", "justification", "confidence_score"]
+}
+
+REPAIR_MAX_INPUT_CHARS = 2000
+
+# Only these characters can change scanner state, so we jump between them
+_OUTSIDE_STRING = re.compile(r'[{}"]')
+_INSIDE_STRING = re.compile(r'["\\]')
+# A "{" that can begin an object: JSON keys are strings, so next comes '"' or an empty '}'
+_OBJECT_START = re.compile(r'\{[ \t\n\r]*["}]')
+_JSON_WHITESPACE = " \t\n\r"
+
+# False starts tolerated before giving up; bounds the rescans to MAX_RESTARTS passes over the text
+MAX_RESTARTS = 16
+
+_schema_supported = True
+
+
+class ResponseParseError(ValueError):
+    def __init__(self, message: str, text: str = ""):
+        super().__init__(message)
+        self.text = text
+
+
+class JSONStreamDecoder:
+    """Single-pass incremental scanner that returns the first complete top-level JSON object.
+
+    Text can be fed in arbitrary pieces (e.g. streamed tokens); call `finish()` at the end.
+    Only a `{` followed by optional whitespace and `"` or `}` can start a candidate, so stray
+    braces in prose are skipped for free. A candidate that fails to parse, or never closes,
+    is rescanned from the next possible start after it; after `max_restarts` such false
+    starts we give up with ResponseParseError so the caller's bounded retry runs instead.
+    """
+
+    def __init__(self, max_restarts: int = MAX_RESTARTS):
+        self.result: Optional[dict] = None
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self._pieces = []
+        self._carry = ""
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def _restart(self):
+        self.restarts += 1
+        if self.restarts > self.max_restarts:
+            raise ResponseParseError(f"No JSON object found after {self.max_restarts} false starts")
+
+    def feed(self, chunk: str) -> Optional[dict]:
+        if self.result is not None or not chunk:
+            return self.result
+
+        if self._carry:
+            chunk, self._carry = self._carry + chunk, ""
+        pos, n = 0, len(chunk)
+        if self._escape:
+            self._escape = False
+            pos = 1
+        # Where the current object's text starts inside this chunk
+        segment_start = 0 if self._depth else None
+
+        while pos < n:
+            if self._depth == 0:
+                match = _OBJECT_START.search(chunk, pos)
+                if not match:
+                    # A trailing "{" may still turn out to start an object once more text arrives
+                    tail = chunk.rfind("{", pos)
+                    if tail != -1 and not chunk[tail + 1:].strip(_JSON_WHITESPACE):
+                        self._carry = chunk[tail:]
+                    return None
+                segment_start = match.start()
+                self._depth = 1
+                pos = segment_start + 1
+                continue
+
+            if self._in_string:
+                match = _INSIDE_STRING.search(chunk, pos)
+                if not match:
+                    break
+                if match.group() == "\\":
+                    if match.end() == n:
+                        self._escape = True
+                        break
+                    pos = match.end() + 1
+                    continue
+                self._in_string = False
+                pos = match.end()
+                continue
+
+            match = _OUTSIDE_STRING.search(chunk, pos)
+            if not match:
+                break
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pieces.append(chunk[segment_start:pos])
+                    candidate = "".join(self._pieces)
+                    self._pieces = []
+                    segment_start = None
+                    try:
+                        parsed = json.loads(candidate)
+                    except json.JSONDecodeError:
+                        # Brace-balanced but not JSON: the real object may start inside it
+                        self._restart()
+                        chunk, pos = candidate[1:] + chunk[pos:], 0
+                        n = len(chunk)
+                        continue
+                    if isinstance(parsed, dict):
+                        self.result = parsed
+                        return parsed
+
+        if self._depth and segment_start is not None:
+            self._pieces.append(chunk[segment_start:])
+        return None
+
+    def finish(self) -> Optional[dict]:
+        """End of input: if an object was left open (e.g. by a stray `{`), rescan after its start"""
+        while self.result is None and self._depth:
+            self._restart()
+            pending = "".join(self._pieces)
+            self._pieces = []
+            self._depth = 0
+            self._in_string = False
+            self._escape = False
+            self.feed(pending[1:])
+        return self.result
+
+
+def decode_json_response(text: str) -> dict:
+    decoder = JSONStreamDecoder()
+    try:
+        decoder.feed(text)
+        parsed = decoder.finish()
+    except ResponseParseError as e:
+        raise ResponseParseError(str(e), text)
+    if parsed is None:
+        raise ResponseParseError("No JSON object found in model response", text)
+    return parsed
+
+
+def decode_json_stream(chunks: Iterable[str]) -> dict:
+    """Decode from an iterable of text pieces, stopping as soon as an object closes"""
+    decoder = JSONStreamDecoder()
+    seen = []
+    try:
+        for chunk in chunks:
+            seen.append(chunk)
+            if decoder.feed(chunk) is not None:
+                return decoder.result
+        if decoder.finish() is not None:
+            return decoder.result
+    except ResponseParseError as e:
+        raise ResponseParseError(str(e), "".join(seen))
+    raise ResponseParseError("No JSON object found in streamed model response", "".join(seen))
+
+
+def _generation_config(max_output_tokens: Optional[int], schema: Optional[dict]) -> dict:
+    # None leaves the model's own limit in place
+    config = {"max_output_tokens": max_output_tokens} if max_output_tokens else {}
+    if schema and _schema_supported:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = schema
+    return config
+
+
+async def _stream_json(model_name: str, prompt: str, max_output_tokens: Optional[int], schema: Optional[dict]) -> dict:
+    with start_span("llm.generate", model=model_name, prompt_chars=len(prompt),
+                    max_output_tokens=max_output_tokens) as span:
+        return await _stream_json_traced(span, model_name, prompt, max_output_tokens, schema)
+
+
+def _record_usage(span, chunk):
+    usage = getattr(chunk, "usage_metadata", None)
+    if usage is None:
+        return
+    for attr, key in (("prompt_token_count", "prompt_tokens"), ("candidates_token_count", "output_tokens")):
+        value = getattr(usage, attr, None)
+        if value:
+            span.set_attribute(key, value)
+
+
+async def _stream_json_traced(span, model_name: str, prompt: str, max_output_tokens: Optional[int],
+                              schema: Optional[dict]) -> dict:
+    global _schema_supported
+    try:
+        model = genai.GenerativeModel(model_name, generation_config=_generation_config(max_output_tokens, schema))
+        response = await model.generate_content_async(prompt, stream=True)
+    except (TypeError, ValueError, KeyError) as e:
+        if not (schema and _schema_supported):
+            raise
+        # Older SDKs/models reject response_schema; remember and fall back to prompt-only JSON
+        logger.warning(f"Schema-constrained output unavailable, falling back: {e}")
+        _schema_supported = False
+        model = genai.GenerativeModel(model_name, generation_config=_generation_config(max_output_tokens, None))
+        response = await model.generate_content_async(prompt, stream=True)
+
+    span.set_attribute("schema", bool(schema and _schema_supported))
+    decoder = JSONStreamDecoder()
+    seen = []
+    try:
+        async for chunk in response:
+            _record_usage(span, chunk)
+            try:
+                piece = chunk.text
+            except ValueError:
+                # Chunk without text parts (e.g. safety metadata only)
+                continue
+            seen.append(piece)
+            if decoder.feed(piece) is not None:
+                span.set_attribute("output_chars", sum(len(p) for p in seen))
+                return decoder.result
+        span.set_attribute("output_chars", sum(len(p) for p in seen))
+        if decoder.finish() is not None:
+            return decoder.result
+    except ResponseParseError as e:
+        # Too many false starts; hand the full output to the repair retry
+        raise ResponseParseError(str(e), "".join(seen))
+    raise ResponseParseError("No JSON object found in model response", "".join(seen))
+
+
+async def generate_json(model_name: str, prompt: str, schema: Optional[dict] = None,
+                        max_output_tokens: Optional[int] = 200, retries: int = 1,
+                        repair_model: str = "gemini-1.5-flash") -> dict:
+    """Call Gemini and decode a JSON object from its streamed output.
+
+    A parse failure is counted and followed by at most `retries` cheap repair calls that
+    ask a small model to reformat the bad output. Raises ResponseParseError if all fail.
+    """
+    try:
+        parsed = await _stream_json(model_name, prompt, max_output_tokens, schema)
+        parse_stats["parsed"] += 1
+        return parsed
+    except ResponseParseError as e:
+        parse_stats["failures"] += 1
+        logger.warning(f"Could not parse model response as JSON: {e.text[:100]}...")
+        error = e
+
+    for _ in range(retries):
+        parse_stats["retries"] += 1
+        repair_prompt = f"""Rewrite the following text as one valid JSON object{' matching this schema: ' + json.dumps(schema) if schema else ''}.
+Return ONLY the JSON object.
+
+{error.text[:REPAIR_MAX_INPUT_CHARS]}"""
+        try:
+            parsed = await _stream_json(repair_model, repair_prompt, max_output_tokens, schema)
+            parse_stats["parsed"] += 1
+            parse_stats["retry_successes"] += 1
+            return parsed
+        except ResponseParseError as e:
+            parse_stats["failures"] += 1
+            error = ResponseParseError(str(e), error.text)
+
+    raise error
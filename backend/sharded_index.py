@@ -0,0 +1,243 @@
+import heapq
+import logging
+import multiprocessing as mp
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# Move documents between shards once the largest exceeds the smallest by this fraction of the mean
+REBALANCE_TOLERANCE = 0.2
+# ...and by at least this many rows, so tiny indexes don't churn
+REBALANCE_MIN_ROWS = 256
+
+
+def _shard_worker(conn, dim: int, dtype: str):
+    """Owns one VectorIndex; serves commands from the parent over a pipe until 'stop'"""
+    index = VectorIndex(dim=dim, dtype=dtype)
+    keys: List[str] = []
+    doc_ids: List[str] = []
+
+    while True:
+        command, *args = conn.recv()
+        try:
+            if command == "add":
+                document_id, new_keys, vectors = args
+                index.add(vectors)
+                keys.extend(new_keys)
+                doc_ids.extend([document_id] * len(new_keys))
+                conn.send(("ok", len(keys)))
+            elif command == "search":
+                queries, top_k, document_id = args
+                rows = None
+                if document_id is not None:
+                    rows = [i for i, d in enumerate(doc_ids) if d == document_id]
+                scores, indices = index.search(queries, top_k=top_k, rows=rows)
+                conn.send(("ok", (scores, [[keys[i] for i in row] for row in indices])))
+            elif command == "export":
+                (document_id,) = args
+                rows = [i for i, d in enumerate(doc_ids) if d == document_id]
+                conn.send(("ok", ([keys[i] for i in rows], index.vectors(np.asarray(rows, dtype=np.int64)))))
+            elif command == "remove":
+                (document_id,) = args
+                mask = np.array([d != document_id for d in doc_ids], dtype=bool)
+                index.keep(mask)
+                keys = [k for k, keep in zip(keys, mask) if keep]
+                doc_ids = [d for d, keep in zip(doc_ids, mask) if keep]
+                conn.send(("ok", len(keys)))
+            elif command == "nbytes":
+                conn.send(("ok", index.nbytes))
+            elif command == "stop":
+                conn.send(("ok", None))
+                return
+            else:
+                conn.send(("error", f"Unknown command {command!r}"))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+class _Shard:
+    def __init__(self, ctx, dim: int, dtype: str):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_shard_worker, args=(child, dim, dtype), daemon=True)
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()
+        self.rows = 0
+
+    def send(self, *message):
+        self.conn.send(message)
+
+    def recv(self):
+        status, payload = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Shard worker error: {payload}")
+        return payload
+
+    def call(self, *message):
+        with self.lock:
+            self.send(*message)
+            return self.recv()
+
+
+class ShardedIndex:
+    """Vector index partitioned by document_id across worker processes.
+
+    Each document lives wholly on one shard (the least loaded at insert time). A search
+    is scattered to every shard in parallel, each returns its local top-k, and the parent
+    merges them with a heap. Deleting a document may move other documents between
+    shards to keep row counts balanced.
+    """
+
+    def __init__(self, num_shards: int, dim: int = 384, dtype: str = "float32"):
+        # spawn: forking a process that already holds torch/uvicorn threads is unsafe
+        ctx = mp.get_context("spawn")
+        self.dim = dim
+        self.dtype = dtype
+        self.shards = [_Shard(ctx, dim, dtype) for _ in range(max(1, num_shards))]
+        self.assignments: Dict[str, int] = {}
+        self.document_rows: Dict[str, int] = {}
+        self._meta_lock = threading.Lock()
+        self._rebalance_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(shard.rows for shard in self.shards)
+
+    def shard_sizes(self) -> List[int]:
+        return [shard.rows for shard in self.shards]
+
+    def nbytes(self) -> int:
+        """Vector storage held by all shard workers (one round trip per shard)"""
+        return sum(shard.call("nbytes") for shard in self.shards)
+
+    def add_document(self, document_id: str, keys: List[str], vectors: np.ndarray, shard_id: Optional[int] = None):
+        if not keys:
+            return
+        with self._meta_lock:
+            if document_id in self.assignments:
+                shard_id = self.assignments[document_id]
+            elif shard_id is None:
+                shard_id = min(range(len(self.shards)), key=lambda i: self.shards[i].rows)
+            self.assignments[document_id] = shard_id
+            self.document_rows[document_id] = self.document_rows.get(document_id, 0) + len(keys)
+            self.shards[shard_id].rows += len(keys)
+        self.shards[shard_id].call("add", document_id, list(keys), np.asarray(vectors, dtype=np.float32))
+
+    def remove_document(self, document_id: str, rebalance: bool = True) -> int:
+        with self._meta_lock:
+            shard_id = self.assignments.pop(document_id, None)
+            rows = self.document_rows.pop(document_id, 0)
+            if shard_id is None:
+                return 0
+            self.shards[shard_id].rows -= rows
+        self.shards[shard_id].call("remove", document_id)
+        if rebalance:
+            self.rebalance()
+        return rows
+
+    def export_document(self, document_id: str) -> Tuple[List[str], np.ndarray]:
+        """(keys, float32 vectors) of one document, read from its shard"""
+        shard_id = self.assignments.get(document_id)
+        if shard_id is None:
+            return [], np.empty((0, self.dim), dtype=np.float32)
+        return self.shards[shard_id].call("export", document_id)
+
+    def _move_document(self, document_id: str, source: int, dest: int) -> bool:
+        """Returns False if the document was gone (removed concurrently) and nothing moved"""
+        keys, vectors = self.shards[source].call("export", document_id)
+        if not keys:
+            return False
+        self.shards[dest].call("add", document_id, keys, vectors)
+        with self._meta_lock:
+            moved = self.assignments.get(document_id) == source
+            if moved:
+                self.assignments[document_id] = dest
+                self.shards[dest].rows += len(keys)
+                self.shards[source].rows -= len(keys)
+        if not moved:
+            # Removed by another thread mid-move; drop the copy we just added
+            self.shards[dest].call("remove", document_id)
+            return False
+        # Searches between the add and the remove may see the document twice; merge() dedupes keys
+        self.shards[source].call("remove", document_id)
+        return True
+
+    def rebalance(self) -> int:
+        """Greedily move whole documents from the largest to the smallest shard. Returns moves made."""
+        with self._rebalance_lock:
+            moves = self._rebalance()
+        if moves:
+            logger.info(f"Rebalanced shards with {moves} document moves: {self.shard_sizes()}")
+        return moves
+
+    def _rebalance(self) -> int:
+        moves = 0
+        while len(self.shards) > 1:
+            sizes = self.shard_sizes()
+            largest, smallest = int(np.argmax(sizes)), int(np.argmin(sizes))
+            gap = sizes[largest] - sizes[smallest]
+            if gap <= max(REBALANCE_MIN_ROWS, REBALANCE_TOLERANCE * np.mean(sizes)):
+                break
+            # Prefer the document closest to half the gap; only moves that shrink the gap count.
+            # Snapshot under _meta_lock: ingest threads add documents concurrently.
+            with self._meta_lock:
+                candidates = [(abs(rows - gap / 2), doc) for doc, rows in self.document_rows.items()
+                              if self.assignments.get(doc) == largest and rows < gap]
+            if not candidates:
+                break
+            _, document_id = min(candidates)
+            if self._move_document(document_id, largest, smallest):
+                moves += 1
+        return moves
+
+    def search(self, query_embs: np.ndarray, top_k: int = 5,
+               document_id: Optional[str] = None) -> List[List[Tuple[float, str]]]:
+        """Top-k (score, key) pairs per query, merged across shards"""
+        queries = np.asarray(query_embs, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+
+        if document_id is not None:
+            shard_id = self.assignments.get(document_id)
+            targets = [] if shard_id is None else [self.shards[shard_id]]
+        else:
+            targets = [shard for shard in self.shards if shard.rows]
+        if not targets:
+            return [[] for _ in range(len(queries))]
+
+        # Scatter to every shard before gathering so shards search concurrently.
+        # Locks are always taken in shard order, so concurrent searches cannot deadlock.
+        for shard in targets:
+            shard.lock.acquire()
+        try:
+            for shard in targets:
+                shard.send("search", queries, top_k, document_id)
+            partials = [shard.recv() for shard in targets]
+        finally:
+            for shard in targets:
+                shard.lock.release()
+        return self.merge(partials, len(queries), top_k)
+
+    @staticmethod
+    def merge(partials, n_queries: int, top_k: int) -> List[List[Tuple[float, str]]]:
+        merged = []
+        for qi in range(n_queries):
+            best = {}
+            for scores, keys in partials:
+                for score, key in zip(scores[qi], keys[qi]):
+                    if score > best.get(key, -np.inf):
+                        best[key] = float(score)
+            merged.append(heapq.nlargest(top_k, ((s, k) for k, s in best.items())))
+        return merged
+
+    def close(self):
+        for shard in self.shards:
+            try:
+                shard.call("stop")
+            except (EOFError, OSError, RuntimeError):
+                pass
+            shard.process.join(timeout=5)
+            if shard.process.is_alive():
+                shard.process.terminate()
@@ -0,0 +1,41 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one running computation.
+
+    The first caller for a key starts the work as its own task; callers arriving while
+    it runs await the same task. The key is released as soon as the task finishes, so
+    later calls start fresh. Work runs in a task (and callers await it shielded) so one
+    caller disconnecting doesn't cancel the result everyone else is waiting for.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"executions": 0, "coalesced": 0}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Returns (result, shared) where shared is True if another caller's run was reused"""
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._release(key, t))
+        return await asyncio.shield(task), shared
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
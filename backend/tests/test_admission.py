@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+
+
+def deadline(seconds=5.0):
+    return time.monotonic() + seconds
+
+
+async def hold(controller, lane, order, name, release, timeout=5.0):
+    async with controller.slot(lane, deadline(timeout)):
+        order.append(name)
+        await release.wait()
+
+
+def test_interactive_waiters_dispatch_before_older_batch_waiters():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        order, release = [], asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "batch", order, "holder", release))
+        await asyncio.sleep(0)
+        batch = asyncio.ensure_future(hold(controller, "batch", order, "batch", asyncio.Event()))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(hold(controller, "interactive", order, "interactive", asyncio.Event()))
+        await asyncio.sleep(0.01)
+        assert controller.snapshot()["queued"] == {"interactive": 1, "batch": 1}
+        release.set()
+        await asyncio.sleep(0.01)
+        assert order == ["holder", "interactive"]
+        batch.cancel()
+        interactive.cancel()
+        await asyncio.gather(holder, batch, interactive, return_exceptions=True)
+    asyncio.run(run())
+
+
+def test_full_lane_queue_rejects_with_429():
+    async def run():
+        controller = AdmissionController(max_concurrent=1, max_queue={"batch": 1})
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(hold(controller, "batch", [], i, release)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as excinfo:
+            await controller._acquire("batch", deadline())
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.retry_after >= 1
+        assert controller.stats["rejected_queue_full"] == 1
+        # Interactive has its own queue bound
+        waiter = asyncio.ensure_future(hold(controller, "interactive", [], "i", release))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*tasks, waiter)
+        assert controller.snapshot()["active"] == 0
+    asyncio.run(run())
+
+
+def test_expired_while_waiting_raises_503():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "interactive", [], "holder", release))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as excinfo:
+            await controller._acquire("interactive", deadline(0.05))
+        assert excinfo.value.status_code == 503
+        assert controller.snapshot()["queued"]["interactive"] == 0
+        release.set()
+        await holder
+    asyncio.run(run())
+
+
+def test_already_passed_deadline_raises_503_without_queueing():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        with pytest.raises(Overloaded) as excinfo:
+            await controller._acquire("batch", time.monotonic() - 1)
+        assert excinfo.value.status_code == 503
+        assert controller.snapshot()["active"] == 0
+    asyncio.run(run())
+
+
+def test_waiter_expired_at_dispatch_is_skipped():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        release, order = asyncio.Event(), []
+        holder = asyncio.ensure_future(hold(controller, "interactive", order, "holder", release))
+        await asyncio.sleep(0)
+        stale = asyncio.ensure_future(controller._acquire("interactive", deadline(5)))
+        fresh = asyncio.ensure_future(hold(controller, "interactive", order, "fresh", asyncio.Event()))
+        await asyncio.sleep(0.01)
+        # Backdate the first waiter so it has expired by the time the slot frees up
+        controller._queues["interactive"][0].deadline = time.monotonic() - 1
+        release.set()
+        await holder
+        with pytest.raises(Overloaded) as excinfo:
+            await stale
+        assert excinfo.value.status_code == 503
+        await asyncio.sleep(0.01)
+        assert order == ["holder", "fresh"]
+        assert controller.stats["expired"] == 1
+        fresh.cancel()
+        await asyncio.gather(fresh, return_exceptions=True)
+        assert controller.snapshot()["active"] == 0
+    asyncio.run(run())
+
+
+def test_slot_released_when_granted_waiter_is_cancelled():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "interactive", [], "holder", release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(controller._acquire("interactive", deadline()))
+        await asyncio.sleep(0.01)
+        # Free the slot (granting it to the waiter) and cancel the waiter before it resumes
+        release.set()
+        await holder
+        assert controller.snapshot()["active"] == 1
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert controller.snapshot()["active"] == 0
+        async with controller.slot("interactive", deadline(0.1)) as ticket:
+            assert ticket.queue_time == 0.0
+    asyncio.run(run())
+
+
+def test_cancelled_queued_waiter_leaves_the_queue():
+    async def run():
+        controller = AdmissionController(max_concurrent=1)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(hold(controller, "batch", [], "holder", release))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(controller._acquire("batch", deadline()))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert controller.snapshot()["queued"]["batch"] == 0
+        release.set()
+        await holder
+        assert controller.snapshot()["active"] == 0
+    asyncio.run(run())
+
+
+def test_unknown_lane_is_rejected():
+    async def run():
+        with pytest.raises(ValueError):
+            await AdmissionController()._acquire("bulk", deadline())
+    asyncio.run(run())
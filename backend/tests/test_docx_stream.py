@@ -0,0 +1,92 @@
+import zipfile
+
+import pytest
+
+from docx_stream import extract_text_docx_stream, iter_docx_segments
+
+NS = ('xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+      'xmlns:mc="http://schemas.openxmlformats.org/markup-compatibility/2006" '
+      'xmlns:wps="http://schemas.microsoft.com/office/word/2010/wordprocessingShape" '
+      'xmlns:v="urn:schemas-microsoft-com:vml"')
+
+
+def p(text, style=None, extra=""):
+    props = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f"<w:p>{props}<w:r><w:t>{text}</w:t></w:r>{extra}</w:p>"
+
+
+def table(*rows):
+    body = "".join("<w:tr>" + "".join(f"<w:tc>{cell}</w:tc>" for cell in row) + "</w:tr>" for row in rows)
+    return f"<w:tbl>{body}</w:tbl>"
+
+
+def text_box(choice, fallback):
+    return ("<w:r><mc:AlternateContent>"
+            f"<mc:Choice Requires=\"wps\"><w:drawing><wps:txbx><w:txbxContent>{choice}</w:txbxContent></wps:txbx></w:drawing></mc:Choice>"
+            f"<mc:Fallback><w:pict><v:textbox><w:txbxContent>{fallback}</w:txbxContent></v:textbox></w:pict></mc:Fallback>"
+            "</mc:AlternateContent></w:r>")
+
+
+@pytest.fixture
+def make_docx(tmp_path):
+    def make(body):
+        path = tmp_path / "doc.docx"
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr("word/document.xml", f"<w:document {NS}><w:body>{body}</w:body></w:document>")
+        return str(path)
+    return make
+
+
+def segments(path):
+    return [(s["kind"], s["text"]) for s in iter_docx_segments(path)]
+
+
+def test_text_box_keeps_anchor_paragraph_and_skips_fallback(make_docx):
+    path = make_docx(p("Anchor text", extra=text_box(p("Boxed"), p("Boxed copy"))) + p("After"))
+    assert segments(path) == [("paragraph", "Boxed"), ("paragraph", "Anchor text"), ("paragraph", "After")]
+
+
+def test_table_in_fallback_does_not_swallow_later_content(make_docx):
+    fallback = table([p("hidden a"), p("hidden b")])
+    body = p("Before", extra=text_box(p("Shown"), fallback)) + p("Later") + table([p("x"), p("y")])
+    assert segments(make_docx(body)) == [
+        ("paragraph", "Shown"), ("paragraph", "Before"), ("paragraph", "Later"), ("table_row", "x | y")]
+
+
+def test_table_rows_and_nested_table(make_docx):
+    nested = table([p("n1"), p("n2")])
+    body = table([p("Limit"), p("Amount")], [p("Room") + nested, p("5000")])
+    assert segments(make_docx(body)) == [("table_row", "Limit | Amount"), ("table_row", "Room n1 | n2 | 5000")]
+
+
+def test_headings_and_section_breaks(make_docx):
+    body = (p("Intro")
+            + p("Cover", style="Heading1") + p("Eligible")
+            + p("End of part", extra="<w:pPr><w:sectPr/></w:pPr>")
+            + p("Untitled part")
+            + "<w:sectPr/>")
+    result = [(s["kind"], s["text"], s["section"]) for s in iter_docx_segments(make_docx(body))]
+    assert result == [
+        ("paragraph", "Intro", "Section 1"),
+        ("heading", "## Cover", "Cover"),
+        ("paragraph", "Eligible", "Cover"),
+        ("paragraph", "End of part", "Cover"),
+        ("paragraph", "Untitled part", "Section 2"),
+    ]
+
+
+def test_explicit_page_breaks(make_docx):
+    body = p("One") + p("Two", extra='<w:r><w:br w:type="page"/></w:r>') + p("Three")
+    assert [(s["text"], s["page"]) for s in iter_docx_segments(make_docx(body))] == [("One", 1), ("Two", 1), ("Three", 2)]
+
+
+def test_rendered_page_breaks_take_precedence(make_docx):
+    body = (p("One") + '<w:p><w:r><w:lastRenderedPageBreak/><w:t>Two</w:t></w:r></w:p>'
+            + p("Three", extra='<w:r><w:br w:type="page"/></w:r>') + p("Four"))
+    assert [(s["text"], s["page"]) for s in iter_docx_segments(make_docx(body))] == [
+        ("One", 1), ("Two", 2), ("Three", 2), ("Four", 2)]
+
+
+def test_tabs_and_line_breaks(make_docx):
+    body = '<w:p><w:r><w:t>a</w:t><w:tab/><w:t>b</w:t><w:br/><w:t>c</w:t></w:r></w:p>'
+    assert extract_text_docx_stream(make_docx(body)) == "a\tb\nc"
@@ -0,0 +1,153 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from index_snapshot import (CURRENT_FILE, SnapshotError, load_snapshot, prune_snapshots, resolve_snapshot,
+                            set_current, write_snapshot)
+
+DIM = 384
+
+
+def unit_rows(count, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_chunks(document_id, count):
+    return [{"id": f"{document_id}_{i}", "content": f"clause {i}", "document_id": document_id, "filename": "p.pdf"}
+            for i in range(count)]
+
+
+def test_round_trip(tmp_path):
+    chunks, vectors = make_chunks("doc-a", 3), unit_rows(3)
+    version_dir = write_snapshot(str(tmp_path), chunks, vectors, {"hash-a": "doc-a"}, model_name="m")
+    manifest, loaded_chunks, loaded_vectors = load_snapshot(str(tmp_path))
+    assert manifest["version"] == os.path.basename(version_dir)
+    assert manifest["count"] == 3 and manifest["dim"] == DIM and manifest["model"] == "m"
+    assert manifest["document_hashes"] == {"hash-a": "doc-a"}
+    assert loaded_chunks == chunks
+    np.testing.assert_array_equal(loaded_vectors, vectors)
+
+
+def test_mmap_load_is_read_only(tmp_path):
+    write_snapshot(str(tmp_path), make_chunks("doc-a", 2), unit_rows(2), {})
+    _, _, vectors = load_snapshot(str(tmp_path), mmap=True)
+    assert isinstance(vectors, np.memmap)
+    with pytest.raises(ValueError):
+        vectors[0, 0] = 1.0
+
+
+def test_current_pointer_follows_latest_and_can_be_moved(tmp_path):
+    root = str(tmp_path)
+    first = write_snapshot(root, make_chunks("doc-a", 1), unit_rows(1), {})
+    second = write_snapshot(root, make_chunks("doc-b", 2), unit_rows(2), {})
+    assert resolve_snapshot(root) == second
+    assert load_snapshot(root)[0]["count"] == 2
+
+    set_current(root, os.path.basename(first))
+    assert (tmp_path / CURRENT_FILE).read_text() == os.path.basename(first)
+    assert load_snapshot(root)[0]["count"] == 1
+    # A version directory loads on its own, whatever CURRENT says
+    assert load_snapshot(second)[0]["count"] == 2
+
+    with pytest.raises(SnapshotError):
+        set_current(root, "snap-missing")
+
+
+def test_write_without_make_current_leaves_pointer(tmp_path):
+    root = str(tmp_path)
+    first = write_snapshot(root, make_chunks("doc-a", 1), unit_rows(1), {})
+    write_snapshot(root, make_chunks("doc-b", 1), unit_rows(1), {}, make_current=False)
+    assert resolve_snapshot(root) == first
+
+
+def test_checksum_mismatch_is_rejected(tmp_path):
+    version_dir = write_snapshot(str(tmp_path), make_chunks("doc-a", 2), unit_rows(2), {})
+    path = os.path.join(version_dir, "vectors.npy")
+    data = bytearray(open(path, "rb").read())
+    data[-1] ^= 0xFF
+    with open(path, "wb") as f:
+        f.write(data)
+    with pytest.raises(SnapshotError, match="checksum"):
+        load_snapshot(str(tmp_path))
+    # verify=False skips the check (same size, so the load itself succeeds)
+    assert load_snapshot(str(tmp_path), verify=False)[0]["count"] == 2
+
+
+def test_truncated_file_is_rejected(tmp_path):
+    version_dir = write_snapshot(str(tmp_path), make_chunks("doc-a", 2), unit_rows(2), {})
+    with open(os.path.join(version_dir, "chunks.jsonl"), "a") as f:
+        f.write("\n")
+    with pytest.raises(SnapshotError, match="wrong size"):
+        load_snapshot(str(tmp_path))
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    version_dir = write_snapshot(str(tmp_path), make_chunks("doc-a", 1), unit_rows(1), {})
+    manifest_path = os.path.join(version_dir, "manifest.json")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    manifest["format_version"] = 99
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    with pytest.raises(SnapshotError, match="Unsupported snapshot format"):
+        load_snapshot(str(tmp_path))
+
+
+def test_mismatched_counts_are_rejected(tmp_path):
+    with pytest.raises(SnapshotError):
+        write_snapshot(str(tmp_path), make_chunks("doc-a", 2), unit_rows(3), {})
+
+
+def test_missing_snapshot(tmp_path):
+    with pytest.raises(SnapshotError):
+        load_snapshot(str(tmp_path))
+
+
+def test_prune_keeps_current(tmp_path):
+    root = str(tmp_path)
+    versions = [write_snapshot(root, make_chunks("doc", 1), unit_rows(1), {}) for _ in range(3)]
+    set_current(root, os.path.basename(versions[0]))
+    prune_snapshots(root, keep=1)
+    assert sorted(d for d in os.listdir(root) if d.startswith("snap-")) == sorted(
+        os.path.basename(v) for v in (versions[0], versions[2]))
+
+
+@pytest.fixture
+def main_module(monkeypatch):
+    os.environ.setdefault("GOOGLE_API_KEY", "test")
+    import main
+    monkeypatch.setattr(main, "documents", [])
+    monkeypatch.setattr(main, "embeddings", main.VectorIndex(dim=DIM))
+    monkeypatch.setattr(main, "document_status", {})
+    monkeypatch.setattr(main, "document_hashes", {})
+    monkeypatch.setattr(main, "loaded_snapshot", None)
+    monkeypatch.setattr(main, "index_version", main.index_version)
+    return main
+
+
+def test_hot_swap_maps_vectors_and_resets_status(tmp_path, main_module):
+    main = main_module
+    main.document_status.update({
+        "doc-old": {"status": "ready", "chunks": 4},
+        "doc-failed": {"status": "failed", "chunks": 0},
+        "doc-busy": {"status": "processing", "chunks": 0},
+    })
+    vectors = unit_rows(3)
+    write_snapshot(str(tmp_path), make_chunks("doc-a", 3), vectors, {"hash-a": "doc-a"})
+    version_before = main.index_version
+
+    manifest = main.load_index_snapshot(str(tmp_path))
+
+    assert main.loaded_snapshot == manifest["version"]
+    assert main.index_version == version_before + 1
+    assert main.embeddings.mapped
+    assert main.document_hashes == {"hash-a": "doc-a"}
+    assert main.document_status == {
+        "doc-a": {"status": "ready", "chunks": 3},
+        "doc-busy": {"status": "processing", "chunks": 0},
+    }
+    results = main.search_by_vectors(vectors[1:2], top_k=1)[0]
+    assert results[0]["content"] == "clause 1" and results[0]["document_id"] == "doc-a"
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+
+from response_parser import JSONStreamDecoder, ResponseParseError, decode_json_response, decode_json_stream
+
+
+def split_every(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_plain_object():
+    assert decode_json_response('{"coverage": "COVERED", "reason": "ok"}') == {"coverage": "COVERED", "reason": "ok"}
+
+
+def test_object_inside_prose_and_code_fence():
+    text = 'Sure! Here is the result:\n```json\n{"coverage": "REVIEW"}\n```\nLet me know.'
+    assert decode_json_response(text) == {"coverage": "REVIEW"}
+
+
+def test_first_object_wins():
+    assert decode_json_response('{"a": 1} {"b": 2}') == {"a": 1}
+
+
+def test_nested_objects():
+    assert decode_json_response('x {"a": {"b": {"c": [1, {"d": 2}]}}} y') == {"a": {"b": {"c": [1, {"d": 2}]}}}
+
+
+def test_braces_and_quotes_inside_strings():
+    text = '{"reason": "clause {4.2} says \\"no\\" } here", "n": 1}'
+    assert decode_json_response(text) == {"reason": 'clause {4.2} says "no" } here', "n": 1}
+
+
+def test_escaped_backslash_before_closing_quote():
+    assert decode_json_response('{"path": "C:\\\\", "ok": true}') == {"path": "C:\\", "ok": True}
+
+
+def test_unclosed_stray_brace_before_object():
+    assert decode_json_response('Note {placeholder. {"coverage":"X"}') == {"coverage": "X"}
+
+
+def test_several_stray_braces_before_object():
+    assert decode_json_response('{ { {oops {"coverage": "Y"}') == {"coverage": "Y"}
+
+
+def test_balanced_non_json_wrapping_object():
+    assert decode_json_response('{see {"coverage": "Z"}}') == {"coverage": "Z"}
+
+
+def test_balanced_non_json_before_object():
+    assert decode_json_response('{placeholder} then {"coverage": "W"}') == {"coverage": "W"}
+
+
+def test_top_level_array_is_not_an_object():
+    with pytest.raises(ResponseParseError):
+        decode_json_response('[1, 2, 3]')
+
+
+def test_no_object_raises_with_text():
+    with pytest.raises(ResponseParseError) as excinfo:
+        decode_json_response("I cannot answer that.")
+    assert excinfo.value.text == "I cannot answer that."
+
+
+def test_truncated_object_raises():
+    with pytest.raises(ResponseParseError):
+        decode_json_response('{"coverage": "COVERED", "reason": "cut of')
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_streamed_in_arbitrary_pieces(size):
+    text = 'prefix {"reason": "a \\"quoted\\" {brace} \\\\ end", "list": [{"x": 1}]} suffix'
+    assert decode_json_stream(split_every(text, size)) == {"reason": 'a "quoted" {brace} \\ end', "list": [{"x": 1}]}
+
+
+def test_escape_split_across_pieces():
+    assert decode_json_stream(['{"a": "x\\', '"y"}']) == {"a": 'x"y'}
+
+
+@pytest.mark.parametrize("size", [1, 4])
+def test_streamed_stray_brace_recovers_at_end(size):
+    assert decode_json_stream(split_every('Note {placeholder. {"coverage":"X"}', size)) == {"coverage": "X"}
+
+
+def test_stream_stops_at_first_complete_object():
+    decoder = JSONStreamDecoder()
+    assert decoder.feed('{"a": ') is None
+    assert decoder.feed('1}') == {"a": 1}
+    # Further input is ignored once an object is found
+    assert decoder.feed('{"b": 2}') == {"a": 1}
+    assert decoder.finish() == {"a": 1}
+
+
+def test_empty_chunks_are_ignored():
+    assert decode_json_stream(["", '{"a"', "", ': 1}']) == {"a": 1}
+
+
+def test_stray_brace_split_from_its_key():
+    assert decode_json_stream(["x {", '  ', '"a": 1}']) == {"a": 1}
+    assert decode_json_stream(["x {", "see", ' {"a": 1}']) == {"a": 1}
+
+
+def test_stray_spaced_braces_are_skipped_cheaply():
+    assert decode_json_response("{ " * 8000 + '{"coverage": "X"}') == {"coverage": "X"}
+
+
+def test_too_many_false_starts_raises_with_text():
+    text = '{"a" x} ' * 40 + '{"coverage": "X"}'
+    with pytest.raises(ResponseParseError) as excinfo:
+        decode_json_response(text)
+    assert excinfo.value.text == text
+
+
+@pytest.mark.parametrize("text", [
+    "{" * 8000,
+    "{ " * 8000 + '{"coverage": "X"}',
+    '{"a" ' * 8000,
+    '{"a" ' * 8000 + "}" * 8000,
+    '{"a": {' * 8000 + '"b": x' + "}" * 8000,
+], ids=["unclosed", "spaced", "unclosed-keys", "nested-keys", "nested-invalid"])
+def test_pathological_input_is_fast(text):
+    start = time.perf_counter()
+    try:
+        decode_json_response(text)
+    except ResponseParseError:
+        pass
+    assert time.perf_counter() - start < 1.0
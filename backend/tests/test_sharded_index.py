@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+import sharded_index
+from sharded_index import ShardedIndex
+
+DIM = 8
+
+
+def unit_rows(count, seed):
+    vectors = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def add(index, document_id, count, seed, shard_id=None):
+    vectors = unit_rows(count, seed)
+    index.add_document(document_id, [f"{document_id}_{i}" for i in range(count)], vectors, shard_id=shard_id)
+    return vectors
+
+
+@pytest.fixture
+def index():
+    index = ShardedIndex(2, dim=DIM)
+    yield index
+    index.close()
+
+
+def test_merge_keeps_best_score_per_key_and_orders_by_score():
+    partials = [
+        (np.array([[0.9, 0.5], [0.2, 0.1]]), [["a", "b"], ["a", "b"]]),
+        (np.array([[0.95, 0.7], [0.3, 0.25]]), [["a", "c"], ["c", "d"]]),
+    ]
+    merged = ShardedIndex.merge(partials, n_queries=2, top_k=2)
+    assert merged == [[(0.95, "a"), (0.7, "c")], [(0.3, "c"), (0.25, "d")]]
+
+
+def test_merge_with_fewer_results_than_top_k():
+    partials = [(np.array([[0.4]]), [["a"]]), (np.zeros((1, 0)), [[]])]
+    assert ShardedIndex.merge(partials, n_queries=1, top_k=5) == [[(0.4, "a")]]
+
+
+def test_documents_go_to_least_loaded_shard_and_search_spans_shards(index):
+    a = add(index, "doc-a", 5, seed=1)
+    b = add(index, "doc-b", 3, seed=2)
+    add(index, "doc-a", 2, seed=3)  # more chunks stay with the document's shard
+    assert index.assignments["doc-a"] != index.assignments["doc-b"]
+    assert sorted(index.shard_sizes()) == [3, 7]
+
+    results = index.search(np.vstack([a[0], b[1]]), top_k=1)
+    assert results[0][0][1] == "doc-a_0" and results[1][0][1] == "doc-b_1"
+    assert results[0][0][0] == pytest.approx(1.0, abs=1e-5)
+
+    filtered = index.search(a[0], top_k=10, document_id="doc-b")[0]
+    assert {key for _, key in filtered} == {f"doc-b_{i}" for i in range(3)}
+    assert index.search(a[0], top_k=3, document_id="missing") == [[]]
+    assert index.nbytes() > 0
+
+
+def test_rebalance_moves_whole_documents_and_keeps_them_searchable(index, monkeypatch):
+    monkeypatch.setattr(sharded_index, "REBALANCE_MIN_ROWS", 0)
+    vectors = {}
+    for i, size in enumerate([6, 2, 2, 2]):
+        vectors[f"doc-{i}"] = add(index, f"doc-{i}", size, seed=10 + i, shard_id=0)
+    add(index, "doc-big", 6, seed=20, shard_id=1)
+    index.remove_document("doc-big", rebalance=False)
+    assert index.shard_sizes() == [12, 0]
+
+    moves = index.rebalance()
+    assert moves >= 1
+    sizes = index.shard_sizes()
+    assert sum(sizes) == 12 and max(sizes) - min(sizes) <= 6
+    assert sizes == [sum(index.document_rows[d] for d, s in index.assignments.items() if s == shard)
+                     for shard in range(2)]
+    for document_id, vecs in vectors.items():
+        keys, exported = index.export_document(document_id)
+        assert keys == [f"{document_id}_{i}" for i in range(len(vecs))]
+        np.testing.assert_allclose(exported, vecs, atol=1e-6)
+        assert index.search(vecs[0], top_k=1)[0][0][1] == f"{document_id}_0"
+
+
+def test_rebalance_stops_within_tolerance(index):
+    add(index, "doc-a", 10, seed=1, shard_id=0)
+    assert index.rebalance() == 0
+    assert index.shard_sizes() == [10, 0]
+
+
+def test_move_of_concurrently_removed_document_leaves_no_copy(index):
+    add(index, "doc-a", 4, seed=1, shard_id=0)
+    # remove_document's bookkeeping ran first; the worker still holds the rows
+    index.assignments.pop("doc-a")
+    index.document_rows.pop("doc-a")
+    assert index._move_document("doc-a", 0, 1) is False
+    assert index.shards[1].call("export", "doc-a")[0] == []
+    assert index.shard_sizes() == [4, 0]
+
+
+def test_move_document(index):
+    vectors = add(index, "doc-a", 4, seed=1, shard_id=0)
+    assert index._move_document("doc-a", 0, 1) is True
+    assert index.assignments["doc-a"] == 1 and index.shard_sizes() == [0, 4]
+    assert index.shards[0].call("export", "doc-a")[0] == []
+    np.testing.assert_allclose(index.export_document("doc-a")[1], vectors, atol=1e-6)
+    assert index._move_document("doc-missing", 0, 1) is False
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_run():
+    async def run():
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "done"
+
+        results = await asyncio.gather(*[flight.do("k", work) for _ in range(3)], flight.do("other", work))
+        assert [r[0] for r in results] == ["done"] * 4
+        assert [r[1] for r in results] == [False, True, True, False]
+        assert len(calls) == 2
+        assert flight.stats == {"executions": 2, "coalesced": 2}
+        assert len(flight) == 0
+    asyncio.run(run())
+
+
+def test_cancelled_caller_does_not_cancel_shared_run():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.02)
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("k", work))
+        await started.wait()
+        follower = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == (42, True)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+    asyncio.run(run())
+
+
+def test_exception_reaches_every_caller_and_releases_key():
+    async def run():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(flight.do("k", fail), flight.do("k", fail), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(flight) == 0
+
+        async def ok():
+            return "fresh"
+
+        assert await flight.do("k", ok) == ("fresh", False)
+    asyncio.run(run())
@@ -0,0 +1,105 @@
+import hashlib
+
+import pytest
+
+from upload_stream import MAX_PART_HEADER_BYTES, MULTIPART_OVERHEAD_BYTES, StreamingUpload, UploadRejected
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def part(name, data, filename=None, extra_headers=""):
+    disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+    return (f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n{extra_headers}\r\n").encode() + data + b"\r\n"
+
+
+def body(*parts):
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def receive(tmp_path, data, chunk_size=None, limit=1024):
+    upload = StreamingUpload(CONTENT_TYPE, str(tmp_path / "upload.part"), limit=limit)
+    chunk_size = chunk_size or len(data)
+    try:
+        for i in range(0, len(data), chunk_size):
+            upload.feed(data[i:i + chunk_size])
+        upload.close()
+    except UploadRejected:
+        upload.discard()
+        raise
+    return upload
+
+
+def test_file_is_written_and_hashed(tmp_path):
+    content = b"%PDF-1.7 policy text"
+    upload = receive(tmp_path, body(part("note", b"hello"), part("file", content, "policy.pdf")))
+    assert upload.finished and upload.filename == "policy.pdf"
+    assert upload.size == len(content)
+    assert upload.content_hash == hashlib.sha256(content).hexdigest()
+    assert (tmp_path / "upload.part").read_bytes() == content
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7])
+def test_split_chunks_give_the_same_result(tmp_path, chunk_size):
+    content = b"PK\x03\x04" + bytes(range(256))
+    upload = receive(tmp_path, body(part("file", content, "policy.docx")), chunk_size=chunk_size)
+    assert upload.finished and upload.size == len(content)
+    assert (tmp_path / "upload.part").read_bytes() == content
+
+
+def test_file_over_limit_is_413(tmp_path):
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, body(part("file", b"x" * 2000, "big.txt")), chunk_size=256)
+    assert excinfo.value.status_code == 413
+    assert not (tmp_path / "upload.part").exists()
+
+
+def test_oversized_other_field_is_413(tmp_path):
+    junk = part("junk", b"x" * (MULTIPART_OVERHEAD_BYTES + 4096))
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, body(junk, part("file", b"small", "a.txt")), chunk_size=4096)
+    assert excinfo.value.status_code == 413
+
+
+def test_oversized_part_headers_are_rejected(tmp_path):
+    # Each line stays under python-multipart's own per-line limit; together they pass ours
+    header = "".join(f"X-Padding-{i}: " + "a" * 4000 + "\r\n" for i in range(MAX_PART_HEADER_BYTES // 4000 + 1))
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, body(part("file", b"small", "a.txt", extra_headers=header)), chunk_size=512, limit=10**6)
+    assert excinfo.value.status_code == 431
+
+
+def test_malformed_body_is_400(tmp_path):
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, b"--wrongboundary\r\n\r\n")
+    assert excinfo.value.status_code == 400
+
+
+def test_unsupported_extension_is_415(tmp_path):
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, body(part("file", b"MZ\x90\x00", "setup.exe")))
+    assert excinfo.value.status_code == 415
+
+
+@pytest.mark.parametrize("content", [b"<html>not a pdf", b"%P"])
+def test_signature_mismatch_is_415(tmp_path, content):
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, body(part("file", content, "policy.pdf")))
+    assert excinfo.value.status_code == 415
+
+
+def test_missing_file_part(tmp_path):
+    upload = receive(tmp_path, body(part("note", b"hello"), part("other", b"%PDF", "policy.pdf")))
+    assert upload.finished and upload.filename is None and upload.size == 0
+
+
+def test_file_part_without_filename_is_400(tmp_path):
+    with pytest.raises(UploadRejected) as excinfo:
+        receive(tmp_path, body(part("file", b"text")))
+    assert excinfo.value.status_code == 400
+
+
+def test_non_multipart_content_type_is_400(tmp_path):
+    with pytest.raises(UploadRejected) as excinfo:
+        StreamingUpload("application/json", str(tmp_path / "upload.part"))
+    assert excinfo.value.status_code == 400
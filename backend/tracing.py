@@ -0,0 +1,240 @@
+"""Minimal in-process tracing: nested spans, W3C traceparent propagation, JSONL/console export.
+
+Spans follow OpenTelemetry's shape (trace_id/span_id/parent_id, start/end, attributes, status)
+so exported files can be converted or replayed into a real collector later. The current span
+lives in a contextvar, which asyncio tasks inherit; thread and process hops need `bind` and
+`inject`/`extract`.
+
+    TRACE_EXPORT=console                # print finished spans to stderr
+    TRACE_EXPORT=traces.jsonl           # append one JSON object per finished span
+    python tracing.py traces.jsonl      # slowest traces as span trees
+"""
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Mapping, Optional
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "hackrx-backend")
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "")
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+
+class SpanContext:
+    __slots__ = ("trace_id", "span_id")
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional[SpanContext], attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.status_description = None
+        self.start_ns = time.time_ns()
+        self._start_perf = time.perf_counter()
+        self.duration = None
+
+    @property
+    def context(self) -> SpanContext:
+        return SpanContext(self.trace_id, self.span_id)
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record_exception(self, error: BaseException):
+        self.status = "ERROR"
+        self.status_description = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        self.duration = time.perf_counter() - self._start_perf
+
+    def to_dict(self) -> dict:
+        end_ns = self.start_ns + int((self.duration or 0.0) * 1e9)
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time": _isoformat(self.start_ns),
+            "end_time": _isoformat(end_ns),
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": {"status_code": self.status, "description": self.status_description},
+            "attributes": self.attributes,
+            "resource": {"service.name": SERVICE_NAME, "process.pid": os.getpid()}
+        }
+
+
+def _isoformat(ns: int) -> str:
+    return datetime.fromtimestamp(ns / 1e9, tz=timezone.utc).isoformat()
+
+
+class _Exporter:
+    """Writes finished spans as JSON lines; reopens the file after a fork"""
+
+    def __init__(self, target: str):
+        self.target = target
+        self._lock = threading.Lock()
+        self._file = None
+        self._pid = None
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            if self.target == "console":
+                print(line, file=sys.stderr, flush=True)
+                return
+            if self._file is None or self._pid != os.getpid():
+                self._file = open(self.target, "a", encoding="utf-8", buffering=1)
+                self._pid = os.getpid()
+            self._file.write(line + "\n")
+
+
+_exporter = _Exporter(TRACE_EXPORT) if TRACE_EXPORT else None
+
+
+def configure(target: Optional[str]):
+    """Switch export to "console", a JSONL path, or off (None/"")"""
+    global _exporter
+    _exporter = _Exporter(target) if target else None
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(name: str, parent: Optional[SpanContext] = None, **attributes) -> Iterator[Span]:
+    """Open a child of `parent` (default: the current span) and make it current until exit"""
+    if parent is None:
+        active = _current_span.get()
+        parent = active.context if active is not None else None
+    span = Span(name, parent, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+        if _exporter is not None:
+            try:
+                _exporter.export(span)
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Span export failed: {e}")
+
+
+def bind(fn):
+    """Wrap `fn` to run in a copy of the caller's context, for run_in_executor and thread pools"""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def format_traceparent(context: SpanContext) -> str:
+    return f"00-{context.trace_id}-{context.span_id}-01"
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    if not value:
+        return None
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[0] == "ff":
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if set(parts[1]) == {"0"} or set(parts[2]) == {"0"}:
+        return None
+    return SpanContext(parts[1], parts[2])
+
+
+def inject(carrier: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Add the current span's traceparent to `carrier` (headers, or a dict sent to a worker process)"""
+    carrier = {} if carrier is None else carrier
+    span = _current_span.get()
+    if span is not None:
+        carrier["traceparent"] = format_traceparent(span.context)
+    return carrier
+
+
+def extract(carrier: Optional[Mapping[str, str]]) -> Optional[SpanContext]:
+    return parse_traceparent(carrier.get("traceparent")) if carrier else None
+
+
+class TraceLogFilter(logging.Filter):
+    """Sets record.trace to " [trace=<id>]" inside a span (else "") for use in log formats"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = _current_span.get()
+        record.trace = f" [trace={span.trace_id}]" if span is not None else ""
+        return True
+
+
+def print_trees(path: str, slowest: int = 10, trace_id: Optional[str] = None):
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                spans.append(json.loads(line))
+
+    traces: Dict[str, list] = {}
+    for span in spans:
+        traces.setdefault(span["context"]["trace_id"], []).append(span)
+    if trace_id:
+        selected = [trace_id] if trace_id in traces else []
+    else:
+        def root_duration(tid):
+            ids = {s["context"]["span_id"] for s in traces[tid]}
+            return max(s["duration_ms"] for s in traces[tid] if s["parent_id"] not in ids)
+        selected = sorted(traces, key=root_duration, reverse=True)[:slowest]
+
+    for tid in selected:
+        members = traces[tid]
+        ids = {s["context"]["span_id"] for s in members}
+        children: Dict[Optional[str], list] = {}
+        for span in members:
+            parent = span["parent_id"] if span["parent_id"] in ids else None
+            children.setdefault(parent, []).append(span)
+
+        print(f"trace {tid}")
+
+        def walk(parent: Optional[str], depth: int):
+            for span in sorted(children.get(parent, []), key=lambda s: s["start_time"]):
+                status = "" if span["status"]["status_code"] == "OK" else f"  !{span['status']['description']}"
+                attrs = " ".join(f"{k}={v}" for k, v in span["attributes"].items())
+                print(f"{span['duration_ms']:10.1f} ms  {'  ' * depth}{span['name']}  {attrs}{status}")
+                walk(span["context"]["span_id"], depth + 1)
+
+        walk(None, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="JSONL file written with TRACE_EXPORT=<path>")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of slowest traces to print")
+    parser.add_argument("--trace-id", help="Print only this trace")
+    args = parser.parse_args()
+    print_trees(args.path, args.slowest, args.trace_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import hashlib
+import os
+from typing import Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+    from python_multipart.exceptions import MultipartParseError
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+    from multipart.exceptions import MultipartParseError
+
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# Room for multipart boundaries and part headers on top of the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Headers of any one part (Content-Disposition, Content-Type, ...); older parsers don't bound them
+MAX_PART_HEADER_BYTES = 8 * 1024
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+# Extension -> required leading bytes (None means no signature check)
+ALLOWED_UPLOAD_TYPES = {
+    ".pdf": b"%PDF",
+    ".docx": b"PK\x03\x04",
+    ".txt": None,
+}
+
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def check_declared_length(content_length: Optional[str], limit: int = MAX_UPLOAD_BYTES):
+    """Reject from the Content-Length header alone, before any body bytes are read"""
+    if content_length and content_length.isdigit() and int(content_length) > limit + MULTIPART_OVERHEAD_BYTES:
+        raise UploadRejected(413, f"File exceeds the {limit // (1024 * 1024)}MB limit")
+
+
+class StreamingUpload:
+    """Incremental multipart receiver for a single file field.
+
+    Body chunks go through `feed`; the file part is validated as soon as its headers
+    and first bytes arrive, hashed on the fly and buffered into large blocks that the
+    caller writes out with `flush` (typically from a worker thread). The whole body is
+    bounded too, so other fields can't stream unlimited data when Content-Length is absent.
+    """
+
+    def __init__(self, content_type: str, dest_path: str, field_name: str = "file",
+                 limit: int = MAX_UPLOAD_BYTES):
+        ctype, params = parse_options_header(content_type)
+        if ctype != b"multipart/form-data" or b"boundary" not in params:
+            raise UploadRejected(400, "Expected multipart/form-data upload")
+
+        self.field_name = field_name
+        self.limit = limit
+        self.dest_path = dest_path
+        self.filename: Optional[str] = None
+        self.size = 0
+        self.received = 0
+        self.finished = False
+        self._hasher = hashlib.sha256()
+        self._buffer = bytearray()
+        self._out = None
+        self._signature: Optional[bytes] = None
+        self._checked_signature = False
+        self._in_file_part = False
+        self._header_field = b""
+        self._header_value = b""
+        self._header_bytes = 0
+        self._part_headers = {}
+
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_end": self._on_end,
+        })
+
+    @property
+    def content_hash(self) -> str:
+        return self._hasher.hexdigest()
+
+    @property
+    def pending_bytes(self) -> int:
+        return len(self._buffer)
+
+    def feed(self, chunk: bytes):
+        self.received += len(chunk)
+        if self.received > self.limit + MULTIPART_OVERHEAD_BYTES:
+            raise UploadRejected(413, f"Upload exceeds the {self.limit // (1024 * 1024)}MB limit")
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as e:
+            raise UploadRejected(400, f"Malformed multipart body: {e}")
+
+    def flush(self):
+        """Hash and write buffered file bytes. Blocking; run off the event loop."""
+        if not self._buffer:
+            return
+        data = memoryview(self._buffer)
+        if self._out is None:
+            self._out = open(self.dest_path, "wb", buffering=0)
+        self._hasher.update(data)
+        self._out.write(data)
+        data.release()
+        self._buffer = bytearray()
+
+    def close(self):
+        self.flush()
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+
+    def discard(self):
+        if self._out is not None:
+            self._out.close()
+            self._out = None
+        if os.path.exists(self.dest_path):
+            os.remove(self.dest_path)
+
+    def _on_part_begin(self):
+        self._part_headers = {}
+        self._header_bytes = 0
+
+    def _count_header_bytes(self, size: int):
+        self._header_bytes += size
+        if self._header_bytes > MAX_PART_HEADER_BYTES:
+            raise UploadRejected(431, "Multipart part headers too large")
+
+    def _on_header_field(self, data, start, end):
+        self._count_header_bytes(end - start)
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data, start, end):
+        self._count_header_bytes(end - start)
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        self._part_headers[self._header_field.lower()] = self._header_value
+        self._header_field, self._header_value = b"", b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._part_headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        self._in_file_part = name == self.field_name and self.filename is None
+        if not self._in_file_part:
+            return
+
+        filename = os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace"))
+        if not filename:
+            raise UploadRejected(400, "No filename provided")
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in ALLOWED_UPLOAD_TYPES:
+            raise UploadRejected(415, f"Unsupported file type: {extension or 'none'}")
+        self.filename = filename
+        self._signature = ALLOWED_UPLOAD_TYPES[extension]
+
+    def _on_part_data(self, data, start, end):
+        if not self._in_file_part:
+            return
+        self.size += end - start
+        if self.size > self.limit:
+            raise UploadRejected(413, f"File exceeds the {self.limit // (1024 * 1024)}MB limit")
+        self._buffer += data[start:end]
+        if not self._checked_signature and self._signature and len(self._buffer) >= len(self._signature):
+            if not self._buffer.startswith(self._signature):
+                raise UploadRejected(415, "File content does not match its extension")
+            self._checked_signature = True
+
+    def _on_part_end(self):
+        if self._in_file_part and self._signature and not self._checked_signature:
+            raise UploadRejected(415, "File content does not match its extension")
+        self._in_file_part = False
+
+    def _on_end(self):
+        self.finished = True
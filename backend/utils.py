@@ -1,16 +1,20 @@
 from typing import List
+import bisect
+import logging
 import PyPDF2
-import docx
-from sentence_transformers import SentenceTransformer
+from encoders import load_encoder
+from docx_stream import iter_docx_segments
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 embedding_model = None
 
 def init_model():
     global embedding_model
     if embedding_model is None:
-        # valid, 384-dim, English, free
-        embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+        # backend (torch / onnx) chosen by EMBEDDING_BACKEND; all-MiniLM-L6-v2, 384-dim
+        embedding_model = load_encoder()
 
 def extract_text_pdf(file_path: str) -> str:
     text = ""
@@ -24,11 +28,50 @@ def extract_text_pdf(file_path: str) -> str:
     return text
 
 def extract_text_docx(file_path: str) -> str:
+    return "\n".join(s["text"] for s in extract_segments_docx(file_path))
+
+# Segments carry the text of one PDF page / DOCX paragraph or table row, plus where it came from:
+# {"text": str, "page": int, "section": str}
+
+def extract_segments_pdf(file_path: str) -> List[dict]:
+    segments = []
     try:
-        doc = docx.Document(file_path)
-        return "\n".join([p.text for p in doc.paragraphs])
-    except Exception:
-        return ""
+        with open(file_path, "rb") as f:
+            reader = PyPDF2.PdfReader(f)
+            for number, page in enumerate(reader.pages, start=1):
+                text = page.extract_text() or ""
+                if text.strip():
+                    segments.append({"text": text, "page": number, "section": f"Page {number}"})
+    except Exception as e:
+        logger.error(f"PDF reading failed for {file_path}: {e}")
+    return segments
+
+def extract_segments_docx(file_path: str) -> List[dict]:
+    try:
+        return [
+            {"text": s["text"], "page": s["page"], "section": s["section"]}
+            for s in iter_docx_segments(file_path)
+        ]
+    except Exception as e:
+        logger.error(f"DOCX reading failed for {file_path}: {e}")
+        return []
+
+def extract_segments_text(file_path: str) -> List[dict]:
+    try:
+        with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except Exception as e:
+        logger.error(f"Text file reading failed for {file_path}: {e}")
+        return []
+    return [{"text": text, "page": 1, "section": ""}] if text.strip() else []
+
+def extract_segments(file_path: str, filename: str = "") -> List[dict]:
+    name = (filename or file_path).lower()
+    if name.endswith(".pdf"):
+        return extract_segments_pdf(file_path)
+    if name.endswith(".docx"):
+        return extract_segments_docx(file_path)
+    return extract_segments_text(file_path)
 
 def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
     chunks, start = [], 0
@@ -38,6 +81,27 @@ def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[st
         start += chunk_size - overlap
     return chunks
 
+def chunk_segments(segments: List[dict], chunk_size: int = 1000, overlap: int = 200) -> List[dict]:
+    """chunk_text over the joined segments; each chunk records the page range and section it starts in"""
+    starts, offset = [], 0
+    for segment in segments:
+        starts.append(offset)
+        offset += len(segment["text"]) + 1
+    text = "\n".join(segment["text"] for segment in segments)
+
+    chunks = []
+    for i, content in enumerate(chunk_text(text, chunk_size, overlap)):
+        begin = i * (chunk_size - overlap)
+        first = segments[bisect.bisect_right(starts, begin) - 1]
+        last = segments[bisect.bisect_right(starts, begin + len(content) - 1) - 1]
+        chunks.append({
+            "content": content,
+            "page": first["page"],
+            "page_end": last["page"],
+            "section": first["section"]
+        })
+    return chunks
+
 def semantic_search(query: str, documents: List[dict], embeddings: List[np.ndarray], top_k: int = 3) -> List[dict]:
     if not documents:
         return []
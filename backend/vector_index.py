@@ -0,0 +1,181 @@
+import threading
+from typing import Optional, Tuple
+import numpy as np
+
+INDEX_DTYPES = ("float32", "float16", "int8")
+
+# Rows converted to float32 at a time during the coarse pass
+SEARCH_BLOCK_ROWS = 1024
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: x ~= codes * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class VectorIndex:
+    """Normalized embeddings in one contiguous matrix, stored as float32, float16 or int8.
+
+    Quantized indexes score the whole matrix against an equally quantized query, then
+    re-score the best `top_k * rescore_factor` candidates with the float32 query.
+    Rows stay aligned with the caller's chunk list; appends only write past the current
+    size and deletions build new arrays, so a snapshot taken by `search` stays valid.
+    """
+
+    def __init__(self, dim: int = 384, dtype: str = "float32", rescore_factor: int = 4):
+        if dtype not in INDEX_DTYPES:
+            raise ValueError(f"Unsupported index dtype {dtype!r}, expected one of {INDEX_DTYPES}")
+        self.dim = dim
+        self.dtype = dtype
+        self.rescore_factor = max(1, rescore_factor)
+        self._lock = threading.Lock()
+        self._size = 0
+        self._codes = np.empty((0, dim), dtype=np.int8 if dtype == "int8" else np.dtype(dtype))
+        self._scales = np.empty(0, dtype=np.float32)
+
+    @classmethod
+    def from_normalized(cls, vectors: np.ndarray, dtype: str = "float32", rescore_factor: int = 4) -> "VectorIndex":
+        """Index over already L2-normalized rows. A float32 index wraps them without copying,
+        so a read-only np.memmap stays file-backed until the first add() or keep()."""
+        index = cls(dim=vectors.shape[1], dtype=dtype, rescore_factor=rescore_factor)
+        if dtype == "float32" and vectors.dtype == np.float32 and vectors.ndim == 2:
+            index._codes = vectors
+            index._scales = np.empty(len(vectors), dtype=np.float32)
+            index._size = len(vectors)
+        else:
+            index.add(vectors)
+        return index
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def mapped(self) -> bool:
+        return isinstance(self._codes, np.memmap)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held, including spare capacity from growth (file-backed when `mapped`)"""
+        return self._codes.nbytes + self._scales.nbytes
+
+    def _encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.dtype == "int8":
+            return quantize_int8(vectors)
+        return vectors.astype(self.dtype), np.empty(len(vectors), dtype=np.float32)
+
+    def add(self, vectors: np.ndarray):
+        vectors = _normalize(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-dim vectors, got {vectors.shape[1]}")
+        codes, scales = self._encode(vectors)
+
+        with self._lock:
+            needed = self._size + len(codes)
+            if needed > len(self._codes):
+                capacity = max(needed, 2 * len(self._codes), 1024)
+                grown = np.empty((capacity, self.dim), dtype=self._codes.dtype)
+                grown[:self._size] = self._codes[:self._size]
+                grown_scales = np.empty(capacity, dtype=np.float32)
+                grown_scales[:self._size] = self._scales[:self._size]
+                self._codes, self._scales = grown, grown_scales
+            self._codes[self._size:needed] = codes
+            self._scales[self._size:needed] = scales
+            self._size = needed
+
+    def keep(self, mask: np.ndarray):
+        """Keep only rows where mask is True (copy-on-write so readers are unaffected)"""
+        with self._lock:
+            mask = np.asarray(mask, dtype=bool)[:self._size]
+            self._codes = self._codes[:self._size][mask].copy()
+            self._scales = self._scales[:self._size][mask].copy()
+            self._size = len(self._codes)
+
+    def keep_last(self, n: int):
+        if self._size > n:
+            mask = np.zeros(self._size, dtype=bool)
+            mask[-n:] = True
+            self.keep(mask)
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            return self._codes[:self._size], self._scales[:self._size]
+
+    def vectors(self, rows: Optional[np.ndarray] = None,
+                snapshot: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+        """Float32 (dequantized) vectors for the given rows, or all rows of `snapshot` (default: now)"""
+        codes, scales = snapshot if snapshot is not None else self.snapshot()
+        return self._dequantize(codes, scales, rows)
+
+    def _dequantize(self, codes, scales, rows=None) -> np.ndarray:
+        if rows is not None:
+            codes, scales = codes[rows], scales[rows]
+        out = codes.astype(np.float32)
+        if self.dtype == "int8":
+            out *= scales[:, None]
+        return out
+
+    def _coarse_query(self, queries: np.ndarray) -> np.ndarray:
+        if self.dtype == "int8":
+            return quantize_int8(queries)[0].astype(np.float32)
+        if self.dtype == "float16":
+            return queries.astype(np.float16).astype(np.float32)
+        return queries
+
+    def search(self, query_embs: np.ndarray, top_k: int = 5, rows: Optional[np.ndarray] = None,
+               snapshot: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Cosine top-k for each query. Returns (scores, row_indices), both shaped (n_queries, k).
+
+        `rows` restricts the search to those row indices. Pass a `snapshot()` taken together
+        with the caller's chunk list to keep row numbers aligned with it.
+        """
+        codes, scales = snapshot if snapshot is not None else self.snapshot()
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            codes, scales = codes[rows], scales[rows]
+
+        queries = _normalize(query_embs)
+        n = len(codes)
+        if n == 0 or top_k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.float32), empty.astype(np.int64)
+
+        if self.dtype == "float32":
+            scores = queries @ codes.T
+            k = min(top_k, n)
+            best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, best, axis=1)
+        else:
+            coarse_q = self._coarse_query(queries)
+            coarse = np.empty((len(queries), n), dtype=np.float32)
+            for start in range(0, n, SEARCH_BLOCK_ROWS):
+                block = codes[start:start + SEARCH_BLOCK_ROWS].astype(np.float32)
+                coarse[:, start:start + len(block)] = coarse_q @ block.T
+            if self.dtype == "int8":
+                coarse *= scales[None, :]
+
+            c = min(top_k * self.rescore_factor, n)
+            candidates = np.argpartition(-coarse, c - 1, axis=1)[:, :c]
+            best_scores = np.empty((len(queries), c), dtype=np.float32)
+            for qi, cand in enumerate(candidates):
+                best_scores[qi] = self._dequantize(codes, scales, cand) @ queries[qi]
+            k = min(top_k, c)
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best = np.take_along_axis(candidates, keep, axis=1)
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        if rows is not None:
+            best = rows[best]
+        return best_scores, best
@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 from datetime import datetime
@@ -308,6 +310,67 @@ st.markdown("""
 
 # Backend URL
 BACKEND_URL = "https://hackathon-project-backend-m1qe.onrender.com"
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+INGEST_POLL_TIMEOUT = 90
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One keep-alive session per server process, with retry/backoff on transient failures"""
+    # POSTs are only retried when the connection was refused (nothing was sent). A read timeout
+    # or 504 means the backend may still be working on it, and a 429/503 is the backend shedding
+    # load: re-posting would start another LLM run or undo the shedding. GETs retry on 502/503/504.
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=False,
+        status=3,
+        backoff_factor=0.5,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=10, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_data(ttl=15, show_spinner=False)
+def fetch_index_version() -> int:
+    try:
+        response = get_session().get(f"{BACKEND_URL}/health", timeout=10)
+        return response.json().get("index_version", 0)
+    except Exception:
+        return 0
+
+@st.cache_data(ttl=600, max_entries=256, show_spinner=False)
+def analyze_coverage(query: str, index_version: int) -> dict:
+    """Cached per (query, document set version); errors raise and are not cached"""
+    response = get_session().post(
+        f"{BACKEND_URL}/process-claim",
+        json={"query": query},
+        headers={"X-Priority": "interactive"},
+        timeout=120
+    )
+    # Pipeline failures come back as 5xx, so raising here keeps them out of the cache
+    response.raise_for_status()
+    return response.json()
+
+def wait_for_ingestion(document_id: str) -> dict:
+    """Poll ingestion status with backoff until the document is ready or failed"""
+    deadline = time.time() + INGEST_POLL_TIMEOUT
+    delay = 0.5
+    status = {"status": "processing"}
+    while time.time() < deadline:
+        response = get_session().get(f"{BACKEND_URL}/documents/{document_id}/status", timeout=10)
+        if response.status_code == 200:
+            status = response.json()
+            if status.get("status") in ("ready", "failed"):
+                return status
+        time.sleep(delay)
+        delay = min(delay * 1.5, 3.0)
+    return status
 
 # Header
 st.markdown("""
@@ -337,7 +400,13 @@ uploaded_file = st.file_uploader(
     label_visibility="collapsed"
 )
 
-if uploaded_file is not None:
+if uploaded_file is not None and uploaded_file.size > MAX_UPLOAD_BYTES:
+    st.markdown("""
+    <div class="error-message">
+        ❌ This file is larger than 10MB. Please upload a smaller document.
+    </div>
+    """, unsafe_allow_html=True)
+elif uploaded_file is not None:
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
         if st.button("📤 Process Document", key="upload_btn"):
@@ -354,17 +423,43 @@ if uploaded_file is not None:
                 """, unsafe_allow_html=True)
                 
                 try:
-                    files = {"file": (uploaded_file.name, uploaded_file.getvalue(), uploaded_file.type)}
-                    response = requests.post(f"{BACKEND_URL}/upload-document", files=files, timeout=60)
+                    # requests builds the multipart body in memory; MAX_UPLOAD_BYTES keeps that bounded
+                    uploaded_file.seek(0)
+                    files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
+                    response = get_session().post(f"{BACKEND_URL}/upload-document", files=files, timeout=60)
                     
                     if response.status_code == 200:
+                        result = response.json()
+                        if result.get("status") == "processing":
+                            result = wait_for_ingestion(result["document_id"])
+                        
+                        if result.get("status") in ("ready", "indexed"):
+                            st.session_state["index_version"] = result.get("index_version", 0)
+                            st.markdown("""
+                            <div class="success-message">
+                                ✅ Document processed successfully! You can now ask coverage questions.
+                            </div>
+                            """, unsafe_allow_html=True)
+                        elif result.get("status") == "failed":
+                            st.markdown("""
+                            <div class="error-message">
+                                ❌ We couldn't read any text from this document. Please try another file.
+                            </div>
+                            """, unsafe_allow_html=True)
+                        else:
+                            st.markdown("""
+                            <div class="processing-card">
+                                <div class="processing-text">
+                                    ⏳ Your document is still being processed. You can ask questions in a moment.
+                                </div>
+                            </div>
+                            """, unsafe_allow_html=True)
+                    elif response.status_code in (413, 415):
                         st.markdown("""
-                        <div class="success-message">
-                            ✅ Document processed successfully! You can now ask coverage questions.
+                        <div class="error-message">
+                            ❌ File rejected. Please upload a PDF or DOCX file up to 10MB.
                         </div>
                         """, unsafe_allow_html=True)
-                        time.sleep(1)
-                        st.rerun()
                     else:
                         st.markdown("""
                         <div class="error-message">
@@ -424,14 +519,24 @@ if submit_clicked:
             """, unsafe_allow_html=True)
             
             try:
-                response = requests.post(
-                    f"{BACKEND_URL}/process-claim",
-                    json={"query": query.strip()},
-                    timeout=120  # Increased timeout
-                )
+                index_version = max(fetch_index_version(), st.session_state.get("index_version", 0))
+                busy_message = None
+                try:
+                    result = analyze_coverage(query.strip(), index_version)
+                except requests.exceptions.HTTPError as e:
+                    result = None
+                    if e.response is not None and e.response.status_code in (429, 503):
+                        retry_after = e.response.headers.get("Retry-After")
+                        wait = f"in about {retry_after} seconds" if retry_after else "in a moment"
+                        busy_message = f"The analysis service is busy right now. Please try again {wait}."
                 
-                if response.status_code == 200:
-                    result = response.json()
+                if busy_message:
+                    st.markdown(f"""
+                    <div class="error-message">
+                        ⏳ {busy_message}
+                    </div>
+                    """, unsafe_allow_html=True)
+                elif result is not None:
                     decision = result.get('decision', 'UNKNOWN')
                     explanation = result.get('justification', 'Analysis not available')
                     confidence = result.get('confidence_score', 0)